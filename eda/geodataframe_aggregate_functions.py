@@ -1,14 +1,11 @@
 ## This file contains functions common to charting datasets where a slider picks a time period and normalized data is 
 ## shown in the figure
 
-import json
-import pprint
 import numpy as np
 import pandas as pd
 import altair as alt
 import geopandas as gpd
 from shapely import wkt
-import matplotlib.pyplot as plt
 
 def get_yearly_data(    input_file: str, 
                         time_aggregate_column:str,
@@ -222,9 +219,10 @@ def merge_data_plss( input_file_name, output_file_name):
     plss_range = plss_gdf.dissolve(by='TownshipRange').reset_index()
     
     # create wells geodataframe
-    df_gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.LONGITUDE, df.LATITUDE))
-    #Set the coordinate reference system (the projection that denote the axis for the points)
-    df_gdf = df_gdf.set_crs('epsg:4326')
+    #The coordinate reference system (the projection that denote the axis for the points) is set at construction
+    df_gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.LONGITUDE.to_numpy(dtype=np.float64),
+                                                              df.LATITUDE.to_numpy(dtype=np.float64)),
+                              crs='epsg:4326')
 
     # spatial join based on geometry
     df_plss = df_gdf.sjoin(plss_range, how="left")
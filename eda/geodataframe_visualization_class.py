@@ -1,14 +1,11 @@
 ## This file contains functions common to charting datasets where a slider picks a time period and normalized data is 
 ## shown in the figure
 
-import json
-import pprint
-import numpy as np
+import os
 import pandas as pd
 import altair as alt
 import geopandas as gpd
-from shapely import wkt
-import matplotlib.pyplot as plt
+from functools import lru_cache
 
 
 
@@ -18,8 +15,7 @@ class NormalizedDataSliderVisualization:
            
             # this stores the California county map with couty boundaries as a base
             geo_json_file_loc = base_geofile
-            base_gdf = gpd.read_file(geo_json_file_loc)
-            base_gdf.set_crs('epsg:4326')
+            base_gdf = self._read_geo(geo_json_file_loc)
 
             #Set the class's base chart 
             self.county_base = alt.Chart(base_gdf).mark_geoshape(
@@ -34,12 +30,60 @@ class NormalizedDataSliderVisualization:
                             )
 
             #This stores the San Joaquin River Basin a base geodataframe
-            self.plss_gdf = gpd.read_file(area_geofile)
-            self.plss_range = self.plss_gdf.dissolve(by='TownshipRange').reset_index()
+            self.plss_gdf = self._read_geo(area_geofile)
+            self.plss_range = self._dissolve_township_ranges(area_geofile)
                         
 
 
 
+        @staticmethod
+        @lru_cache(maxsize=4)
+        def _read_geo(path: str) -> gpd.GeoDataFrame:
+            """
+                    This function reads a geospatial file projected in EPSG:4326. The result is cached by path so that
+                    several visualizations do not read (or download) and reproject the same file again.
+                    The returned GeoDataFrame is shared and must not be modified in place
+            """
+            return gpd.read_file(path).to_crs(4326)
+
+        @staticmethod
+        @lru_cache(maxsize=4)
+        def _dissolve_township_ranges(area_geofile: str) -> gpd.GeoDataFrame:
+            """
+                    This function dissolves the plss sections of the area_geofile by Township-Range. The result is cached
+                    by path, together with its spatial index which is reused by every spatial join of the charts.
+                    The dissolved Township-Ranges are also stored in a GeoParquet file next to the area_geofile so that
+                    the dissolve is only computed again when the area_geofile changes
+            """
+            dissolved_file = os.path.splitext(area_geofile)[0] + "_township_range.parquet"
+            if os.path.exists(dissolved_file) and os.path.getmtime(dissolved_file) >= os.path.getmtime(area_geofile):
+                plss_range = gpd.read_parquet(dissolved_file)
+            else:
+                plss_range = NormalizedDataSliderVisualization._read_geo(area_geofile).dissolve(by='TownshipRange').reset_index()
+                plss_range.to_parquet(dissolved_file)
+            plss_range.sindex
+            return plss_range
+
+        def _join_township_ranges(self, df: gpd.GeoDataFrame, range_columns: list = None) -> gpd.GeoDataFrame:
+            """
+                    This function replaces the geometry of the df rows by the Township-Range polygons they intersect.
+                    The cached spatial index of the Township-Ranges is queried in bulk for all the df geometries at once,
+                    which avoids building a new spatial index for every call as gpd.sjoin would do.
+                    range_columns are the columns of the Township-Ranges to keep besides their geometry, all of them if
+                    not provided. df is projected to the coordinate reference system of the Township-Ranges if needed
+            """
+            plss_range = self.plss_range
+            if df.crs is not None and df.crs != plss_range.crs:
+                df = df.to_crs(plss_range.crs)
+            # The index is queried on the cached Township-Ranges themselves, selecting columns would copy them without
+            # their spatial index. The selected columns keep the same rows in the same order
+            df_idx, range_idx = plss_range.sindex.query_bulk(df.geometry, predicate="intersects")
+            if range_columns is not None:
+                plss_range = plss_range[range_columns + [plss_range.geometry.name]]
+            df_poly = pd.concat([plss_range.iloc[range_idx].reset_index(drop=True),
+                                 df.drop(columns=[df.geometry.name]).iloc[df_idx].reset_index(drop=True)], axis=1)
+            return gpd.GeoDataFrame(df_poly, geometry=plss_range.geometry.name, crs=plss_range.crs)
+
         def view_attribute_per_year(self, df, color_col='GSE_GWE_NORMALIZED', time_col = 'YEAR'):
             """
                     This function charts out a geodataframe with a slider that controls the data in the dataframe by the position of the slider indicating a Year period
@@ -48,10 +92,11 @@ class NormalizedDataSliderVisualization:
                     The df will have a geometry of points or polygons. But it is left joined with a dataframe with polygons and hence polygins will be charted 
             
             """
-            #Limit the time range so that the chart can be shown
-            df = df[df[time_col] >= 2014]
+            #Limit the time range so that the chart can be shown. The rows are filtered and only the charted columns are
+            #kept before the spatial join so that it runs on as little data as possible
+            df = df.loc[df[time_col] >= 2014, [df.geometry.name, color_col, time_col]]
             #By left joining the plss dataframe we replace the poin
-            df_poly = self.plss_range.sjoin(df)
+            df_poly = self._join_township_ranges(df, ["TownshipRange"])
 
             min_year_num = df[time_col].min()
             max_year_num = df[time_col].max()
@@ -90,7 +135,7 @@ class NormalizedDataSliderVisualization:
             """
             df = df[df[year_column] == year]
 
-            df_poly = self.plss_range.sjoin(df)
+            df_poly = self._join_township_ranges(df)
             
             return df_poly.explore(color_column)
 
@@ -1,24 +1,16 @@
 import sys
 sys.path.append('..')
 
-import os
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
-from sklearn.utils.validation import check_is_fitted
-from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.pipeline import Pipeline, make_pipeline, FeatureUnion
-from sklearn.compose import make_column_transformer, make_column_selector
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
 
-from sklearn import set_config
-from sklearn.metrics import mean_absolute_error
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, FunctionTransformer, MinMaxScaler
-
-from lib.transform_impute import convert_scaled_array_to_df, get_column_names_after_transform, convert_back_df, fill_from_prev_year, fill_pop_from_prev_year, PandasSimpleImputer, GroupImputer
+from lib.transform_impute import fill_from_prev_year, fill_pop_from_prev_year, GroupImputer
 
 
 def create_transformation_cols(X:pd.DataFrame):
@@ -28,21 +20,31 @@ def create_transformation_cols(X:pd.DataFrame):
         :param X: dataframe to be  transformed
         :output(s): list of columns on which ColumnTransformation is to be applied
     """
+    # The lists are copied so that the cached classification cannot be modified by the caller
+    return {transformer: list(cols) for transformer, cols in _classify_columns(tuple(X.columns)).items()}
 
-    # Set column lists for each transformer to work on
 
-    veg_cols = [
-        col for col in X.columns if col.startswith("VEGETATION_")
-    ]  
-    soil_cols = [
-        col for col in X.columns if col.startswith("SOIL_")
-    ]  
-    crops_cols = [
-        col for col in X.columns if col.startswith("CROP_")
-    ]  
+@lru_cache(maxsize=8)
+def _classify_columns(X_columns: tuple) -> dict:
+
+    """This function classifies the X_columns per transformer. The columns are the same for every fit, so the
+       classification is cached on them. The result is shared and must not be modified
+      
+        :param X_columns: the columns of the dataframe to be transformed
+        :output(s): list of columns on which ColumnTransformation is to be applied
+    """
+
+    # Set column lists for each transformer to work on
+    # The columns are walked once and put in the bucket of their prefix, keeping their order in X
+    prefix_buckets = {"VEGETATION_": [], "SOIL_": [], "CROP_": []}
+    for col in X_columns:
+        for prefix, bucket in prefix_buckets.items():
+            if col.startswith(prefix):
+                bucket.append(col)
+                break
     population_cols = ['POPULATION_DENSITY']
 
-    veg_soils_crops_cols =  veg_cols + soil_cols + crops_cols
+    veg_soils_crops_cols =  prefix_buckets["VEGETATION_"] + prefix_buckets["SOIL_"] + prefix_buckets["CROP_"]
 
     wcr_cols = [
         "TOTALDRILLDEPTH_AVG",
@@ -88,8 +90,10 @@ def create_transformation_pipeline(X:pd.DataFrame, scaler):
     list_cols_used = columns_to_transform["list_cols_used"]
        
     #Transformations through transformers
+    #The imputed values go straight into the scaler which works on numpy arrays, so there is no need to wrap them
+    #back into a dataframe
     wcr_simple_trans = Pipeline(steps=[
-        ("imputer", PandasSimpleImputer(missing_values=np.nan, strategy="constant", fill_value=0)),
+        ("imputer", SimpleImputer(missing_values=np.nan, strategy="constant", fill_value=0)),
         ("scaler", scaler)
     ])
 
@@ -3,41 +3,19 @@ import numpy as np
 import pandas as pd
 import pickle
 
+from functools import lru_cache
 from typing import List, Tuple
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
-from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.base import BaseEstimator, TransformerMixin, clone
 from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.preprocessing import FunctionTransformer, MinMaxScaler
 
 from tensorflow import keras
 
 from lib.split_data import train_test_group_time_split, train_test_time_split
-from lib.transform_impute import fill_from_prev_year, fill_pop_from_prev_year
-
-
-class PandasSimpleImputer(SimpleImputer):
-    """A wrapper around `SimpleImputer` to return data frames with columns."""
-
-    def fit(self, X, y=None):
-        """This function fits the group imputer on the data. In this case, it does nothing.
-
-        :param X: The dataframe to fit on
-        :param y: The target values. The y parameter is present to maintain compatibility with other scikit-learn
-        packages
-        :return: the parent class fit method
-        """
-        self.columns = X.columns
-        return super().fit(X, y)
-
-    def transform(self, X, y=None):
-        """This function imputes the missing values in the dataframe.
-
-        :param X: The dataframe to impute on
-        :param y: The target values. The y parameter is present to maintain compatibility with other scikit-learn
-        :return: The imputed dataframe
-        """
-        return pd.DataFrame(super().transform(X), columns=self.columns)
+from lib.transform_impute import categorize_township_range, downcast_float_columns, fill_from_prev_year, \
+    fill_pop_from_prev_year
 
 
 # This class uses the base classes from scikit-learn and implements fit-transform
@@ -46,7 +24,7 @@ class GroupImputer(BaseEstimator, TransformerMixin):
 
     :param group_by_cols: List of columns used for calculating the aggregated value
     :param impute_for_col: The column to impute
-    :param aggregation_func: The aggregation function to use
+    :param aggregation_func: The aggregation function to use, one of ['mean', 'median', 'min', 'max']
     """
 
     def __init__(self, group_by_cols: List[str], impute_for_col: str, aggregation_func="mean"):
@@ -73,32 +51,21 @@ class GroupImputer(BaseEstimator, TransformerMixin):
         :param y: The target values. The y parameter is present to maintain compatibility with other scikit-learn
         :return: The imputed dataframe
         """
-        impute_group_map = X.groupby(self.group_by_cols)[[self.impute_for_col]].agg(self.aggregation_func)
+        # The aggregation function is called by name, which goes straight to its dedicated Cython kernel instead of
+        # through the generic agg() dispatch. transform() broadcasts the value of its group to each row, so no join
+        # is needed to align the group values to the rows. The grouping is computed once and shared by both calls. The
+        # groups do not need to be sorted and only the observed Township-Ranges of the categorical are aggregated
+        grouped = X.groupby(self.group_by_cols, sort=False, observed=True)[self.impute_for_col]
+        fill_values = grouped.transform(self.aggregation_func)
 
         ## In the case of GROUNDSURFACELEVATION_AVG, there can be township ranges where
         ## wells construction reports have never been filed, When the map has empty values, fill it
         ## with the "aggregation_func" value of the entire map TBD!!!
-        if self.aggregation_func == "mean":
-            impute_group_map[self.impute_for_col].fillna(
-                impute_group_map[self.impute_for_col].mean(), inplace=True
-            )
-        elif self.aggregation_func == "median":
-            impute_group_map[self.impute_for_col].fillna(
-                impute_group_map[self.impute_for_col].median(), inplace=True
-            )
-        elif self.aggregation_func == "min":
-            impute_group_map[self.impute_for_col].fillna(
-                impute_group_map[self.impute_for_col].min(), inplace=True
-            )
-        elif self.aggregation_func == "max":
-            impute_group_map[self.impute_for_col].fillna(
-                impute_group_map[self.impute_for_col].max(), inplace=True
-            )
-        # Do not modify the original source data.
-        return_df = X.copy()
-        for index, row in impute_group_map.iterrows():
-            return_df.loc[index, self.impute_for_col].fillna(row.values[0], inplace=True)
-        return return_df
+        impute_group_map = getattr(grouped, self.aggregation_func)()
+        fill_values = fill_values.fillna(getattr(impute_group_map, self.aggregation_func)())
+        # Do not modify the original source data. Only the imputed column is new, instead of copying the whole
+        # dataframe
+        return X.assign(**{self.impute_for_col: X[self.impute_for_col].fillna(fill_values)})
 
 
 def create_transformation_cols(X: pd.DataFrame) -> dict:
@@ -107,11 +74,25 @@ def create_transformation_cols(X: pd.DataFrame) -> dict:
     :param X: dataframe to be  transformed
     :return: a dictionary of the list of columns per transformer on which ColumnTransformation is to be applied
     """
-    # Set column lists for each transformer to work on
+    # The lists are copied so that the cached classification cannot be modified by the caller
+    return {transformer: list(cols) for transformer, cols in _classify_columns(tuple(X.columns)).items()}
+
 
-    veg_cols = [col for col in X.columns if col.startswith("VEGETATION_")]
-    soil_cols = [col for col in X.columns if col.startswith("SOIL_")]
-    crops_cols = [col for col in X.columns if col.startswith("CROP_")]
+@lru_cache(maxsize=8)
+def _classify_columns(X_columns: Tuple[str, ...]) -> dict:
+    """This function classifies the X_columns per transformer. The columns are the same for all the train and test
+    datasets, so the classification is cached on them. The result is shared and must not be modified, use
+    create_transformation_cols() instead.
+
+    :param X_columns: the columns of the dataframe to be transformed
+    :return: a dictionary of the list of columns per transformer on which ColumnTransformation is to be applied
+    """
+    # Set column lists for each transformer to work on
+    # The column names are matched against each prefix with a vectorized scan and keep their order in X
+    columns = np.array(X_columns, dtype=str)
+    veg_cols = columns[np.char.startswith(columns, "VEGETATION_")].tolist()
+    soil_cols = columns[np.char.startswith(columns, "SOIL_")].tolist()
+    crops_cols = columns[np.char.startswith(columns, "CROP_")].tolist()
     veg_soils_crops_cols = veg_cols + soil_cols + crops_cols
     population_cols = ["POPULATION_DENSITY"]
     wcr_cols = [
@@ -139,55 +120,78 @@ def create_transformation_cols(X: pd.DataFrame) -> dict:
 
 
 def create_transformation_pipelines(X: pd.DataFrame) -> Tuple[Pipeline, List[str]]:
-    """This function creates pipelines that will be applied on the train and test datasets
+    """This function creates pipelines that will be applied on the train and test datasets. The pipeline is only
+    assembled once per set of columns and an unfitted clone of it is returned, so that each call gets its own
+    estimators to fit.
 
     :param X: dataframe to be  transformed
     :return: a tuple of the pipelines that imputes missing values and he ordered list of column names of the numpy
     array after transformation
     """
-    columns_to_transform = create_transformation_cols(X)
+    impute_pipeline, columns = _build_transformation_pipelines(tuple(X.columns))
+    return clone(impute_pipeline), list(columns)
+
+
+@lru_cache(maxsize=8)
+def _build_transformation_pipelines(X_columns: Tuple[str, ...]) -> Tuple[Pipeline, Tuple[str, ...]]:
+    """This function assembles the unfitted pipelines for a dataframe with the X_columns columns. The result is
+    cached and must not be fitted, use create_transformation_pipelines() instead.
+
+    :param X_columns: the columns of the dataframe to be transformed
+    :return: a tuple of the unfitted pipelines and the ordered column names of the numpy array after transformation
+    """
+    columns_to_transform = _classify_columns(X_columns)
     # Transformations through transformers
+    # The transformers only impute the missing values. The imputed columns are all scaled at once by a single
+    # MinMaxScaler at the end of the pipeline, which works on numpy arrays, so there is no need to wrap them back into
+    # a dataframe
     wcr_simple_trans = Pipeline(steps=[
-        ("imputer", PandasSimpleImputer(missing_values=np.nan, strategy="constant", fill_value=0)),
-        ("scaler", MinMaxScaler())
+        ("imputer", SimpleImputer(missing_values=np.nan, strategy="constant", fill_value=0))
     ])
     # vegetation column transformer
     veg_soil_crops_trans = Pipeline(steps=[
         ("imputer", FunctionTransformer(fill_from_prev_year))
     ])
     pop_trans = Pipeline(steps=[
-        ("imputer", FunctionTransformer(fill_pop_from_prev_year)),
-        ("scaler", MinMaxScaler())
+        ("imputer", FunctionTransformer(fill_pop_from_prev_year))
     ])
 
     # pct_of_capacity of a resevoir is set as minimum of future years data per township range
     pct_trans = Pipeline(steps=[
         ("imputer", GroupImputer(group_by_cols=["TOWNSHIP_RANGE"], impute_for_col="PCT_OF_CAPACITY",
-                                 aggregation_func="min")),
-        ("scaler", MinMaxScaler())])
+                                 aggregation_func="min"))])
 
     # groundsurfaceelevation is set as mean of TownshipRange data per township range
     gse_trans = Pipeline(steps=[
         ("imputer", GroupImputer(group_by_cols=["TOWNSHIP_RANGE"], impute_for_col="GROUNDSURFACEELEVATION_AVG",
-                                 aggregation_func="median")),
-        ("scaler", MinMaxScaler())])
+                                 aggregation_func="median"))])
+
+    # The membership tests are done against a set, the remainder columns keep their order in X
+    used_cols = frozenset(columns_to_transform["used"])
+    remainder_cols = [col for col in X_columns if col not in used_cols]
+    # The vegetation, soils and crops columns are not scaled. They are output last so that all the columns to scale
+    # are contiguous in front of them
+    scaled_cols = (columns_to_transform["wcr"] + columns_to_transform["pop"] + columns_to_transform["pct"]
+                   + columns_to_transform["gse"] + remainder_cols)
+    columns = scaled_cols + columns_to_transform["veg_soils_crops"]
 
     cols_transformer = ColumnTransformer(
         transformers=[
             ("wcr", wcr_simple_trans, columns_to_transform["wcr"]),
-            ("veg_soils_crops", veg_soil_crops_trans, columns_to_transform["veg_soils_crops"]),
             ("pop", pop_trans, columns_to_transform["pop"]),
             ("pct_capacity", pct_trans, columns_to_transform["pct"]),
             ("gse", gse_trans, columns_to_transform["gse"]),
-            #            ("scaler", MinMaxScaler(), columns_to_transform["other"])
+            ("other", "passthrough", remainder_cols),
+            ("veg_soils_crops", veg_soil_crops_trans, columns_to_transform["veg_soils_crops"]),
         ],
-        remainder=MinMaxScaler(),
     )
-
-    remainder_cols = [col for col in X.columns if col not in columns_to_transform["used"]]
-    columns = columns_to_transform["used"] + remainder_cols
-    impute_pipeline = make_pipeline(cols_transformer)
-    return impute_pipeline, columns
+    scaler = ColumnTransformer(transformers=[("scaler", MinMaxScaler(), slice(0, len(scaled_cols)))],
+                               remainder="passthrough")
+    # The features are downcast to single precision and the Township-Ranges are made categorical before going
+    # through the transformers
+    impute_pipeline = make_pipeline(FunctionTransformer(downcast_float_columns),
+                                    FunctionTransformer(categorize_township_range), cols_transformer, scaler)
+    return impute_pipeline, tuple(columns)
 
 
 def evaluate_forecast(y_test: np.ndarray, yhat: np.ndarray) -> Tuple[float, float, float]:
@@ -1,22 +1,93 @@
 import os
+import json
 import pickle
+import hashlib
 import requests
 import concurrent.futures
 import zipfile
+import shutil
+import tempfile
 import time
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow as pa
+import pyarrow.csv as pv
 
-from typing import Tuple, List
+from typing import List
 from datetime import datetime
-from io import BytesIO
 from tqdm import tqdm
 from requests import RequestException
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import html as lxml_html
+
+
+# The Census API responses are parsed with orjson when it is installed, which is several times faster than the
+# standard json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# The geospatial files are written with pyogrio when it is installed, which writes whole columns through the GDAL C API
+# instead of writing the features one by one through fiona
+try:
+    from pyogrio import write_dataframe
+except ImportError:
+    write_dataframe = None
+
+
+# Number of decimals the latitudes and longitudes are rounded to when querying and joining the elevation data
+ELEVATION_LATLON_DECIMALS = 5
+# Name of the file of the elevation data directory holding the elevations sampled from a local DEM
+ELEVATION_DEM_FILE = "lat_lon_elev_dem.csv"
+# Number of seconds the cached Census API responses are reused (one week)
+CENSUS_CACHE_TTL = 7 * 24 * 3600
+# Number of seconds the cached CDEC pages which may still change are reused (one day)
+CDEC_CACHE_TTL = 24 * 3600
+# Number of seconds to wait for the servers to connect or send data
+HTTP_TIMEOUT = 30
+
+
+def create_http_session(pool_size: int = 16) -> requests.Session:
+    """
+    This function creates a requests Session which keeps up to pool_size HTTP connections open per host, to be reused
+    across queries and threads. The queries that fail on a connection error, a server error or throttling (429) are
+    automatically retried with an exponential backoff.
+
+    :param pool_size: the maximum number of connections kept open per host
+    :return: the requests Session
+    """
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# The session shared by all the downloads and web scraping functions
+HTTP_SESSION = create_http_session()
 
 
 # Data Download Functions 
+def download_file(url: str, output_file: str) -> None:
+    """
+    This function downloads a file and streams its content to the specified file. The content is copied to the disk
+    in chunks as it is received, so that large files are never fully held in memory.
+
+    :param url: the URL of the file to download
+    :param output_file: the path of the file where to store the content
+    """
+    with HTTP_SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        # Let urllib3 decompress the content if the server compressed it for the transfer
+        response.raw.decode_content = True
+        with open(output_file, "wb") as f:
+            shutil.copyfileobj(response.raw, f, length=1 << 20)
+
+
 def download_and_extract_zip_file(url: str, extract_dir: str) -> None:
     """
     This function downloads a zip file and extracts it to the specified directory.
@@ -24,20 +95,142 @@ def download_and_extract_zip_file(url: str, extract_dir: str) -> None:
     :param url: the URL of the zip file to download
     :param extract_dir: the directory where to extract the zip file
     """
-    # Download the dataset content
-    zipfile_content = requests.get(url).content
     os.makedirs(extract_dir, exist_ok=True)
-    # extract the zip files directly from the content
-    with zipfile.ZipFile(BytesIO(zipfile_content)) as zf:
+    # Stream the dataset content to a temporary file, the zip archive being read from it
+    with tempfile.TemporaryFile() as zipfile_content, \
+            HTTP_SESSION.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, zipfile_content, length=1 << 20)
+        extract_zip_file(zipfile_content, extract_dir)
+
+
+def extract_zip_file(zipfile_content, extract_dir: str) -> None:
+    """
+    This function extracts the files of a zip archive, without their directories, to the specified directory.
+
+    :param zipfile_content: the path or the file-like object of the zip archive
+    :param extract_dir: the directory where to extract the zip file
+    """
+    with zipfile.ZipFile(zipfile_content) as zf:
         # For each members of the archive
         for member in zf.infolist():
             # If it's a directory, continue
             if member.filename[-1] == "/":
                 continue
             # Else write its content to the dataset root folder
-            with open(os.path.join(extract_dir, os.path.basename(member.filename)),
-                      "wb") as outfile:
-                outfile.write(zf.read(member))
+            with zf.open(member) as infile, open(os.path.join(extract_dir, os.path.basename(member.filename)),
+                                                 "wb") as outfile:
+                shutil.copyfileobj(infile, outfile, length=1 << 20)
+
+
+def write_csv_file(df: pd.DataFrame, output_file: str) -> None:
+    """
+    This function writes a dataframe, without its index, in a CSV file. The dataframe is converted to an Arrow table
+    and written by pyarrow with several threads instead of the pure Python writer of pandas.
+
+    :param df: the dataframe to write
+    :param output_file: the path of the CSV file
+    """
+    pv.write_csv(pa.Table.from_pandas(df, preserve_index=False), output_file)
+
+
+def write_cache_file(cache_file: str, content: bytes) -> None:
+    """This function writes a cache file. The content is written to a temporary file first and then moved so that an
+    interrupted download never leaves a partial cache file.
+
+    :param cache_file: the path of the cache file
+    :param content: the content to cache
+    """
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(content)
+    os.replace(tmp_file, cache_file)
+
+
+def write_geospatial_file(geodf: gpd.GeoDataFrame, output_file: str) -> None:
+    """This function writes a GeoDataFrame without its index to a geospatial file, e.g. a Shapefile. The driver is
+    inferred from the extension of the file.
+
+    :param geodf: the GeoDataFrame to write
+    :param output_file: the path of the geospatial file
+    """
+    if write_dataframe is not None:
+        write_dataframe(geodf, output_file)
+    else:
+        geodf.to_file(output_file, index=False)
+
+
+def get_url_content(url: str, session: requests.Session = None, cache_dir: str = None, cache_ttl: float = None,
+                    cache_extension: str = ".html") -> bytes:
+    """
+    This function gets the raw content of a URL. If a cache_dir is provided, the response is stored in it and reused
+    instead of querying the server again as long as it is not older than cache_ttl seconds, or forever if cache_ttl is
+    None. Once a cached response is too old, the server is asked whether it changed with the ETag and Last-Modified
+    validators it sent. If it did not change (304 Not Modified), the cached response is reused without being downloaded
+    again.
+
+    :param url: the URL to get
+    :param session: an optional requests Session to reuse HTTP connections across queries
+    :param cache_dir: an optional directory where to cache the responses
+    :param cache_ttl: the number of seconds a cached response is reused. None to reuse it forever.
+    :param cache_extension: the extension of the cache files
+    :return: the raw content of the response
+    """
+    if not cache_dir:
+        response = (session or HTTP_SESSION).get(url, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    # The URL may contain an API key, so the cache file is named after its hash
+    cache_file = os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest() + cache_extension)
+    validators_file = cache_file + ".headers"
+    headers = {}
+    if os.path.exists(cache_file):
+        if cache_ttl is None or time.time() - os.path.getmtime(cache_file) < cache_ttl:
+            with open(cache_file, "rb") as f:
+                return f.read()
+        # The cached response is too old, it is revalidated with a conditional request
+        if os.path.exists(validators_file):
+            with open(validators_file, "rb") as f:
+                validators = json_loads(f.read())
+            if validators.get("ETag"):
+                headers["If-None-Match"] = validators["ETag"]
+            if validators.get("Last-Modified"):
+                headers["If-Modified-Since"] = validators["Last-Modified"]
+    response = (session or HTTP_SESSION).get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    if response.status_code == 304:
+        # The cached response is still valid for another cache_ttl seconds
+        os.utime(cache_file)
+        with open(cache_file, "rb") as f:
+            return f.read()
+    response.raise_for_status()
+    os.makedirs(cache_dir, exist_ok=True)
+    write_cache_file(cache_file, response.content)
+    validators = {name: response.headers[name] for name in ["ETag", "Last-Modified"] if name in response.headers}
+    if validators:
+        write_cache_file(validators_file, json.dumps(validators).encode())
+    elif os.path.exists(validators_file):
+        os.remove(validators_file)
+    return response.content
+
+
+def get_census_data(url: str, session: requests.Session = None, cache_dir: str = None,
+                    cache_ttl: float = CENSUS_CACHE_TTL) -> pd.DataFrame:
+    """
+    This function queries the Census Bureau API. The API returns a JSON table whose first row holds the column names.
+    If a cache_dir is provided, the JSON response is stored in it and reused instead of querying the API again as long
+    as it is not older than cache_ttl seconds.
+
+    :param url: the URL of the API query
+    :param session: an optional requests Session to reuse HTTP connections across queries
+    :param cache_dir: an optional directory where to cache the JSON responses
+    :param cache_ttl: the number of seconds a cached response is reused
+    :return: the dataframe of the returned table
+    """
+    content = get_url_content(url, session=session, cache_dir=cache_dir, cache_ttl=cache_ttl, cache_extension=".json")
+    # The raw bytes are parsed directly, without being decoded to text first
+    data = json_loads(content)
+    return pd.DataFrame(data[1:], columns=data[0])
 
 
 def download_population_raw_data(apikey_file: str = "./assets/inputs/population/census_api_token.pickle",
@@ -61,31 +254,41 @@ def download_population_raw_data(apikey_file: str = "./assets/inputs/population/
         Follow the Pickle documentation https://docs.python.org/3/library/pickle.html to create the pickle file.""")
         return
     os.makedirs(os.path.dirname(input_datafile), exist_ok=True)
-    population_df = pd.DataFrame()
     # The population estimates for 2021 is not available from the ACS estimates API yet.
     # All other years population estimates are downloaded from the ACS estimates API. But that API does not provide
     # Tract LAND_AREA information so we use it from the 2021 PDB data.
-    print("Downloading Planning Database Block Tracts land area data. Please wait...")
-    url = "https://api.census.gov/data/2021/pdb/tract?get=LAND_AREA&for=tract:*&in=county:*&in=state:06" \
-          f"&key={token}"
-    area_data = requests.get(url).json()
-    area_df = pd.DataFrame(area_data[1:], columns=area_data[0])
-    area_df["TRACT_ID"] = area_df["state"] + area_df["county"] + area_df["tract"]
-    area_df = area_df[["TRACT_ID", "LAND_AREA"]]
-    # Download
-    for year in range(2014, 2021):
-        print(f"Downloading American Community Survey {year} population estimates data. Please wait...")
-        url = f"https://api.census.gov/data/{year}/acs/acs5?get=B01003_001E&=&for=tract:*&in=county:*" \
-              f"&in=state:06&key={token}"
-        year_data = requests.get(url).json()
-        year_df = pd.DataFrame(year_data[1:], columns=year_data[0])
-        year_df["YEAR"] = int(year)
-        year_df["TRACT_ID"] = year_df["state"] + year_df["county"] + year_df["tract"]
-        year_df.rename(columns={"B01003_001E": "TOTAL_POPULATION"}, inplace=True)
-        year_df = year_df.merge(area_df, on="TRACT_ID")
-        year_df = year_df[["TRACT_ID", "YEAR", "TOTAL_POPULATION", "LAND_AREA"]]
-        population_df = pd.concat([population_df, year_df], axis=0)
-    population_df.to_csv(input_datafile, index=False)
+    area_url = "https://api.census.gov/data/2021/pdb/tract?get=LAND_AREA&for=tract:*&in=county:*&in=state:06" \
+               f"&key={token}"
+    years = list(range(2014, 2021))
+    year_urls = [f"https://api.census.gov/data/{year}/acs/acs5?get=B01003_001E&=&for=tract:*&in=county:*"
+                 f"&in=state:06&key={token}" for year in years]
+    print("Downloading Planning Database Block Tracts land area data and American Community Survey "
+          f"{years[0]}-{years[-1]} population estimates data. Please wait...")
+    # The API responses are cached next to the population data so that a failed or repeated download does not query
+    # the API again
+    cache_dir = os.path.join(os.path.dirname(input_datafile), ".cache")
+    # The API calls are independent and network bound, so they are sent in parallel by a pool of threads sharing the
+    # session of the module to reuse the HTTP connections
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        area_df, *year_data_dfs = executor.map(get_census_data, [area_url] + year_urls,
+                                               [HTTP_SESSION] * (len(year_urls) + 1),
+                                               [cache_dir] * (len(year_urls) + 1))
+    # The frames are built directly with their final columns, instead of adding, renaming and then selecting columns
+    area_df = pd.DataFrame({
+        "TRACT_ID": area_df["state"].str.cat([area_df["county"], area_df["tract"]]),
+        "LAND_AREA": area_df["LAND_AREA"]
+    })
+    # The yearly population estimates are collected and concatenated once after the loop
+    year_dfs = []
+    for year, year_data_df in zip(years, year_data_dfs):
+        year_df = pd.DataFrame({
+            "TRACT_ID": year_data_df["state"].str.cat([year_data_df["county"], year_data_df["tract"]]),
+            "YEAR": int(year),
+            "TOTAL_POPULATION": year_data_df["B01003_001E"]
+        })
+        year_dfs.append(year_df.merge(area_df, on="TRACT_ID"))
+    population_df = pd.concat(year_dfs, axis=0, ignore_index=True)
+    write_csv_file(population_df, input_datafile)
     print("Downloading the geospatial data of the population census Tracts. Please wait...")
     tract_url = "https://www2.census.gov/geo/tiger/TIGER2019/TRACT/tl_2019_06_tract.zip"
     download_and_extract_zip_file(url=tract_url, extract_dir=os.path.dirname(tract_geofile))
@@ -147,10 +350,8 @@ def get_well_completion_latlon(well_datafile: str, start_year: int, end_year: in
         print("Data not found locally.\nDownloading the well completion reports dataset first. Please wait...")
         welldata_url = "https://data.cnra.ca.gov/dataset/647afc02-8954-426d-aabd-eff418d2652c/resource/" \
                        "8da7b93b-4e69-495d-9caa-335691a1896b/download/wellcompletionreports.csv"
-        file_content = requests.get(welldata_url).text
         os.makedirs(os.path.dirname(well_datafile), exist_ok=True)
-        with open(well_datafile, "w") as f:
-            f.write(file_content)
+        download_file(welldata_url, well_datafile)
         print("Loading the Well Completion Reports data. Please wait...")
         wcr_df = pd.read_csv(well_datafile, dtype=dtype)
 
@@ -199,17 +400,21 @@ def get_well_completion_latlon(well_datafile: str, start_year: int, end_year: in
 
     # Capture the unique latitudes and longitudes so that we send only as many API calls as necessary for unique values.
     # We can then join this dataframe to the original. This drops 75639 rows and we care left with 30348 rows
+    # Coordinates are rounded to 5 decimals (~1 meter) first so that wells located at the same place share one query
+    wcr_df = wcr_df.round(ELEVATION_LATLON_DECIMALS)
     wcr_df.drop_duplicates(inplace=True)
+    wcr_df.reset_index(drop=True, inplace=True)
     return wcr_df
 
 
-def get_elevation_from_latlon(lat: float, lon: float) -> float:
+def get_elevation_from_latlon(lat: float, lon: float, session: requests.Session = None) -> float:
     """
     This function queries the National Map service to retrieve the elevation of a point based on its latitude and
     longitude.
 
     :param lat: latitude of the point
     :param lon: longitude of the point
+    :param session: an optional requests Session to reuse HTTP connections across queries
     :return: elevation of the point
     """
     url = r"https://nationalmap.gov/epqs/pqs.php?"
@@ -220,33 +425,66 @@ def get_elevation_from_latlon(lat: float, lon: float) -> float:
         "units": "Meters"
     }
     # Query the national map service
-    result = requests.get(url, params=params).json()
+    result = (session or HTTP_SESSION).get(url, params=params, timeout=HTTP_TIMEOUT).json()
     elevation = result["USGS_Elevation_Point_Query_Service"]["Elevation_Query"]["Elevation"]
     return elevation
 
 
 def get_batch_elevation_from_latlon(df: pd.DataFrame, lat_column: str = "LATITUDE",
-                                    lon_column: str = "LONGITUDE") -> pd.DataFrame:
+                                    lon_column: str = "LONGITUDE", max_workers: int = 32) -> pd.DataFrame:
     """
-    This function uses 5 threads to download in parallel the elevation of a batch of points.
+    This function uses a pool of threads to download in parallel the elevation of a batch of points.
 
     :param df: the dataframe containing the latitude and longitude columns
     :param lat_column: the name of the latitude column
     :param lon_column: the name of the longitude column
+    :param max_workers: the maximum number of concurrent queries to the National Map service
     """
-    # We use multi-threading to load the data in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        elevations = list(tqdm(executor.map(get_elevation_from_latlon, list(df[lat_column]), list(df[lon_column])),
-                               total=len(df)))
+    # The queries are network bound, so we use multi-threading to overlap their latency and share one session to
+    # reuse the HTTP connections between queries
+    with create_http_session(max_workers) as session:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            elevations = list(tqdm(executor.map(get_elevation_from_latlon, list(df[lat_column]), list(df[lon_column]),
+                                                [session] * len(df)),
+                                   total=len(df)))
     # executor.map() returns the values in the same order as the input so we can join the list to the dataframe
     df["elev_meters"] = elevations
     return df
 
 
+def get_batch_elevation_from_dem(df: pd.DataFrame, dem_file: str, lat_column: str = "LATITUDE",
+                                 lon_column: str = "LONGITUDE") -> pd.DataFrame:
+    """
+    This function samples the elevation of a batch of points from a local Digital Elevation Model (DEM) raster file
+    (e.g. a SRTM or 3DEP GeoTIFF covering California) instead of querying the National Map service.
+
+    :param df: the dataframe containing the latitude and longitude columns
+    :param dem_file: the path to the DEM raster file, with elevations in meters
+    :param lat_column: the name of the latitude column
+    :param lon_column: the name of the longitude column
+    """
+    # rasterio is only needed when the elevations are sampled from a local DEM
+    import rasterio
+    from rasterio.warp import transform
+
+    xs = df[lon_column].to_numpy()
+    ys = df[lat_column].to_numpy()
+    with rasterio.open(dem_file) as src:
+        # Project the latitudes and longitudes in the coordinate reference system of the DEM if needed
+        if src.crs is not None and src.crs.to_epsg() != 4326:
+            xs, ys = transform("EPSG:4326", src.crs, xs, ys)
+        elevations = np.fromiter((value[0] for value in src.sample(zip(xs, ys), indexes=1)),
+                                 dtype=np.float32, count=len(df))
+        if src.nodata is not None:
+            elevations[elevations == src.nodata] = np.nan
+    df["elev_meters"] = elevations
+    return df
+
+
 def download_all_elevations(well_datafile: str = "./assets/inputs/wellcompletion/wellcompletion.csv",
                             elevation_basedir: str = "./assets/inputs/wellcompletion/elevation_data",
                             start_year: int = 2014, end_year: int = 2021,
-                            batch_size: int = 1500, wait_between_batches: int = 5) -> None:
+                            batch_size: int = 1500, wait_between_batches: int = 5, dem_file: str = None) -> None:
     """
     This function downloads the elevation of all wells in the well completion dataset.
 
@@ -256,57 +494,87 @@ def download_all_elevations(well_datafile: str = "./assets/inputs/wellcompletion
     :param end_year: the last year to download the elevation data for
     :param batch_size: the number of rows to query the service for at each iteration
     :param wait_between_batches: the number of minutes to wait between batches of queries to the National Map service.
+    :param dem_file: if provided, the path to a local Digital Elevation Model raster file. The elevations are then
+    sampled from this file in one pass instead of being queried from the National Map service.
     """
-    def increase_batch_numbers(start_val: int, end_val: int, increment: int, max_val: int) -> Tuple[int, int]:
-        """This is an internal function to increase the start and end row numbers of the batch"""
-        start_val += increment
-        end_val += increment
-        if (end_val > max_val) and ((end_val - max_val) < increment):
-            end_val = max_val
-        return start_val, end_val
-
     os.makedirs(elevation_basedir, exist_ok=True)
     # We get the latitude and longitude of all wells completed between the start and end years for
     # agriculture, domestic, public or industrial use
     wcr_df = get_well_completion_latlon(well_datafile, start_year, end_year)
-    # Initiate the batch start and end row values
-    start_row = 0
-    end_row = batch_size
+    # With a local DEM there is no network involved, so all the wells are sampled at once
+    if dem_file:
+        print(f"Sampling elevation data for {len(wcr_df)} rows from {dem_file}.")
+        wcr_df = get_batch_elevation_from_dem(wcr_df, dem_file, lat_column="LATITUDE", lon_column="LONGITUDE")
+        wcr_df.to_csv(os.path.join(elevation_basedir, ELEVATION_DEM_FILE), index=False)
+        print("Downloads complete.")
+        return
     max_row = len(wcr_df)
-    while end_row <= max_row:
-        print(f"Downloading elevation data for {start_row} to {end_row} rows of {max_row} rows.")
-        # We extracrt the first batch of rows from the dataframe
-        df = wcr_df.iloc[start_row:end_row, :].copy()
-        part_already_downloaded = False
+    # Each batch is a non-overlapping slice of batch_size rows, the last one holding the remaining rows
+    for start_row in range(0, max_row, batch_size):
+        end_row = min(start_row + batch_size, max_row)
+        batch_file = os.path.join(elevation_basedir, f"lat_lon_elev_{start_row}.csv")
+        df = wcr_df.iloc[start_row:end_row].copy()
         # Check for already downloaded batches
         # To avoid overloading the API service, we check if the batch has already been fully downloaded or not
-        # The file must exist and contains 1500 rows. If it contains less than 1500 rows, we re-download it.
-        try:
-            existing_df = pd.read_csv(os.path.join(elevation_basedir, f"lat_lon_elev_{start_row}.csv"))
-            # If the existing file contains a number of rows equal to the batch size, or if it is the last batch
-            # and it contains a number of rows equal to the remaining rows in the last batch, then we skip the
-            # download
-            if (len(existing_df) == batch_size) or (end_row == max_row and len(existing_df) == (end_row % batch_size)):
-                part_already_downloaded = True
+        # The file must exist and contain the coordinates of all the rows of the batch. If it contains less rows or
+        # other wells (e.g. a batch downloaded before the coordinates were rounded), we re-download it.
+        if os.path.exists(batch_file):
+            batch_latlon = pd.read_csv(batch_file, usecols=["LATITUDE", "LONGITUDE"]).round(ELEVATION_LATLON_DECIMALS)
+            if np.array_equal(batch_latlon[["LATITUDE", "LONGITUDE"]].to_numpy(),
+                              df[["LATITUDE", "LONGITUDE"]].to_numpy()):
                 print(f"Skipping. Elevation data for {start_row} to {end_row} rows already fully downloaded.")
-                start_row, end_row = increase_batch_numbers(start_row, end_row, batch_size, max_row)
-        except FileNotFoundError:
-            pass
+                continue
+        print(f"Downloading elevation data for {start_row} to {end_row} rows of {max_row} rows.")
         # If the batch of lat-lon hasn't been downloaded yet, download it and store the file
-        if not part_already_downloaded:
+        while True:
             try:
                 df = get_batch_elevation_from_latlon(df, lat_column='LATITUDE', lon_column='LONGITUDE')
-                df.to_csv(os.path.join(elevation_basedir, f"lat_lon_elev_{start_row}.csv"), index=False)
-                start_row, end_row = increase_batch_numbers(start_row, end_row, batch_size, max_row)
+                df.to_csv(batch_file, index=False)
+                break
             except RequestException:
                 # We most probably got an error from the API because of the number of requests we made.
-                # So we wait for a few minutes and try again.
+                # So we wait for a few minutes and try the same batch again.
                 print(f"Error occurred. Waiting for {wait_between_batches} minutes before trying again.")
                 time.sleep(wait_between_batches * 60)
     print("Downloads complete.")
 
 
-# Web Scraping with BeautifulSoup
+# Web Scraping with lxml
+def find_html_table(html_content: str, table_id: str, table_class: str = "data"):
+    """This function parses an HTML page with lxml and returns its table with the given id and class.
+
+    :param html_content: the raw HTML content of the page, as text or bytes
+    :param table_id: the id of the table
+    :param table_class: one of the classes of the table
+    :return: the lxml element of the table or None if the page does not have such a table
+    """
+    # lxml cannot parse an empty page, which has no table either
+    if not html_content.strip():
+        return None
+    # The class matches any of the space separated classes of the table, as a CSS class selector does
+    tables = lxml_html.fromstring(html_content).xpath(
+        "//table[@id=$table_id and "
+        "contains(concat(' ', normalize-space(@class), ' '), concat(' ', $table_class, ' '))]",
+        table_id=table_id, table_class=table_class)
+    return tables[0] if tables else None
+
+
+def get_html_table_rows(table, row_class: str = None) -> List[List[str]]:
+    """This function extracts the stripped text of the cells of all the rows of an lxml HTML table. The rows with less
+    than two cells (e.g. header or separator rows) are skipped.
+
+    :param table: the lxml element of the table
+    :param row_class: if provided, only the rows with this class are extracted
+    :return: the list of rows, each a list of the cell texts
+    """
+    rows = table.iter("tr")
+    if row_class:
+        rows = (tr for tr in rows if row_class in tr.get("class", "").split())
+    # The tree is walked by lxml and the text of each cell is gathered by libxml2 in a single call
+    all_rows = ([td.text_content().strip() for td in tr.iter("td")] for tr in rows)
+    return [row for row in all_rows if len(row) > 1]
+
+
 def download_reservoir_stations_geospatial_data(
         stationfile: str = "./assets/inputs/reservoir/map/reservoir_stations.shp") -> None:
     """This function retrieves all the precipitation stations geospatial data and saves them locally in a Shapefile.
@@ -317,63 +585,53 @@ def download_reservoir_stations_geospatial_data(
     """
     print("Scraping reservoir geospatial data from the web. Please wait...")
     # Make a GET request to fetch the raw HTML content
-    html_content = requests.get("https://cdec.water.ca.gov/reportapp/javareports?name=DailyRes").text
-    # Parse the html content
+    html_content = HTTP_SESSION.get("https://cdec.water.ca.gov/reportapp/javareports?name=DailyRes",
+                                    timeout=HTTP_TIMEOUT).text
+    # Parse the html content directly with lxml
     # Note: Developer tools in Chrome will inform you of the element type and element names to be retrieved.
-    soup = BeautifulSoup(html_content, "lxml")
-    station_table = soup.find("table", attrs={"id": "DailyRes_LIST", "class": "data"})
-    all_rows_list = []
-    for eachRow in station_table.find_all("tr"):
-        this_row = []
-        for td in eachRow.find_all("td"):
-            this_row.append(td.text.strip())
-
-        if this_row and len(this_row) > 1:
-            all_rows_list.append(this_row)
-    station_table = pd.DataFrame(all_rows_list)
-    station_table.columns = station_table.iloc[0, :]
-    station_table = station_table.iloc[2:, :].copy()
+    all_rows_list = get_html_table_rows(find_html_table(html_content, "DailyRes_LIST"))
+    # The first row holds the column names and the second one is a separator
+    station_table = pd.DataFrame(all_rows_list[2:], columns=all_rows_list[0])
     station_table.rename(columns={'ID': 'STATION_ID'}, inplace=True)
     station_table.drop(columns=['OPERATOR AGENCY'], inplace=True)
+    # A station listed several times is only kept once
+    station_table.drop_duplicates(ignore_index=True, inplace=True)
+    # As for the precipitation stations, the scraped coordinates are converted to float arrays once, from which the
+    # points are built in one vectorized call
     all_stations_geodf = gpd.GeoDataFrame(
         station_table,
         geometry=gpd.points_from_xy(
-            station_table.LONGITUDE,
-            station_table.LATITUDE
+            station_table.LONGITUDE.to_numpy(dtype=np.float64),
+            station_table.LATITUDE.to_numpy(dtype=np.float64)
         ),
         crs="epsg:4326")
     # Save the file for future direct loading
     os.makedirs(os.path.dirname(stationfile), exist_ok=True)
-    all_stations_geodf.to_file(stationfile, index=False)
+    write_geospatial_file(all_stations_geodf, stationfile)
     print("Download complete.")
 
 
-def scrape_reservoir_data_per_date(a_date: str) -> pd.DataFrame:
+def scrape_reservoir_data_per_date(a_date: str, session: requests.Session = None) -> pd.DataFrame:
+    """This function scrapes the reservoir data of the given date from the CDEC website.
+
+    :param a_date: the date of the report, formatted as YYYYMMDD
+    :param session: the HTTP session to use. It defaults to the module session, whose connections are pooled.
+    :return: the reservoir data of the given date or an empty dataframe if there is no report for this date
+    """
     url = f"https://cdec.water.ca.gov/reportapp/javareports?name=RES.{a_date}"
     # Make a GET request to fetch the raw HTML content
-    html_content = requests.get(url).text
-    # Parse the html content
+    html_content = (session or HTTP_SESSION).get(url, timeout=HTTP_TIMEOUT).text
+    # Parse the html content directly with lxml
     # Note: Developer tools in Chrome will inform you of the element type and element names to be retrieved.
-    soup = BeautifulSoup(html_content, "lxml")
-    reservoir_table = soup.find("table", attrs={"id": "RES", "class": "data"})
+    reservoir_table = find_html_table(html_content, "RES")
     if reservoir_table is None:
         # Return an empty dataframe if there is no data for the given date
         data_table_df = pd.DataFrame()
     else:
-        reservoir_table_header = reservoir_table.thead.find_all("th")
-        reservoir_table_header = [th.text.strip() for th in reservoir_table_header]
-        reservoir_table_header = [elm.strip() for elm in reservoir_table_header[1:]]
-        reservoir_table_rows = reservoir_table.find_all('tr', {'class': 'white'})
-        all_rows_list = []
-        for eachTableRow in reservoir_table_rows:
-            this_row = []
-            for td in eachTableRow.find_all("td"):
-                this_row.append(td.text.strip())
-
-            if this_row and len(this_row) > 1:
-                all_rows_list.append(this_row)
+        reservoir_table_header = [th.text_content().strip() for th in reservoir_table.find(".//thead").iter("th")]
+        reservoir_table_header = reservoir_table_header[1:]
         # Form a data_table for the collection of weekly rows
-        data_table_df = pd.DataFrame(all_rows_list)
+        data_table_df = pd.DataFrame(get_html_table_rows(reservoir_table, row_class="white"))
         data_table_df['date'] = pd.to_datetime(f'{a_date}')
         data_table_df.columns = reservoir_table_header + ['date']
     return data_table_df
@@ -384,31 +642,23 @@ def download_weekly_reservoir_data(reservoir_datafile: str = "./assets/inputs/re
 
     :param reservoir_datafile: The file to save the data to.
     """
-    all_years_reservoir_data = pd.DataFrame()
+    date_list = []
     # The API has no data prior 2018
     for year_start_date in ["2018-01-01", "2019-01-01", "2020-01-01", "2021-01-01", "2022-01-01"]:
-        print(f"Download weekly reservoir data for the year {year_start_date[:4]}. Please wait...")
-
         # inclusive controls whether to include start and end that are on the boundary. The default, “both”,
         # includes boundary points on either end.
-        date_list = pd.date_range(year_start_date, periods=53, freq='W')
-        date_list = [week_date.strftime("%Y%m%d") for week_date in date_list if
-                     pd.to_datetime(week_date).year == pd.to_datetime(year_start_date).year]
-
-        # Create a dataframe for all dates of a year
-        full_year_dataframe = pd.DataFrame()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            reservoirs = list(tqdm(executor.map(scrape_reservoir_data_per_date, date_list), total=len(date_list)))
-        for each_reservoir_data in reservoirs:
-            if not each_reservoir_data.empty:
-                full_year_dataframe = pd.concat([full_year_dataframe, each_reservoir_data], axis=0)
-        if full_year_dataframe.empty:
-            continue
-        # Combine this years data with past years
-        if all_years_reservoir_data.empty:
-            all_years_reservoir_data = full_year_dataframe
-        else:
-            all_years_reservoir_data = pd.concat([all_years_reservoir_data, full_year_dataframe], axis=0)
+        week_dates = pd.date_range(year_start_date, periods=53, freq='W')
+        date_list.extend(week_date.strftime("%Y%m%d") for week_date in week_dates if
+                         week_date.year == pd.to_datetime(year_start_date).year)
+    print(f"Download weekly reservoir data for {len(date_list)} weeks. Please wait...")
+    # The weeks of all the years are scraped by a single pool, so that the pool is not drained at the end of each
+    # year. The fetches are I/O bound and share the pooled connections of the module session. The non-empty weekly
+    # data are then concatenated once, instead of copying the growing dataframes for each week and each year
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        reservoirs = list(tqdm(executor.map(scrape_reservoir_data_per_date, date_list,
+                                            [HTTP_SESSION] * len(date_list)), total=len(date_list)))
+    all_years_reservoir_data = pd.concat([each_reservoir_data for each_reservoir_data in reservoirs
+                                          if not each_reservoir_data.empty], axis=0, ignore_index=True)
     all_years_reservoir_data.rename(columns={'% of Capacity': 'PCT_OF_CAPACITY'}, inplace=True)
     all_years_reservoir_data = all_years_reservoir_data[~all_years_reservoir_data['Reservoir Name'].
         str.contains('Total')].copy()
@@ -429,47 +679,49 @@ def download_weekly_reservoir_data(reservoir_datafile: str = "./assets/inputs/re
     print("Download complete.")
 
 
-def scrape_precipitation_data_per_year(year: int) -> pd.DataFrame:
+def scrape_precipitation_data_per_year(year: int, session: requests.Session = None,
+                                       cache_dir: str = None) -> pd.DataFrame:
     """This function downloads the precipitation data for a given year from the web and returns it as a dataframe.
 
     :param year: the year to download the data from.
+    :param session: an optional requests Session to reuse HTTP connections across queries
+    :param cache_dir: an optional directory where to cache the HTML pages
     :return: the dataframe containing the precipitation data for the given year.
     """
     # The URL for the data for a given year
     url = f"https://cdec.water.ca.gov/reportapp/javareports?name=PRECIPMON.{year}"
-    # Make a GET request to fetch the raw HTML content
-    html_content = requests.get(url).text
-    # Parse the html content
+    # Make a GET request to fetch the raw HTML content. The measurements of the past years do not change anymore, so
+    # their cached pages are reused forever while the pages of the last years are revalidated every day
+    cache_ttl = None if year < datetime.now().year - 1 else CDEC_CACHE_TTL
+    html_content = get_url_content(url, session=session, cache_dir=cache_dir, cache_ttl=cache_ttl)
+    # Parse the html content directly with lxml
     # Note: Developer tools in Chrome will inform you of the element type and element names to be retrieved.
-    soup = BeautifulSoup(html_content, "lxml")
-    precipitation_table = soup.find("table", attrs={"id": "data", "class": "data"})
+    precipitation_table = find_html_table(html_content, "data")
 
     if precipitation_table is None:
         return pd.DataFrame()
 
-    precipitation_table_header = precipitation_table.thead.find_all("th")
-    precipitation_table_header = [th.text for th in precipitation_table_header]
+    precipitation_table_header = [th.text_content() for th in precipitation_table.find(".//thead").iter("th")]
     precipitation_table_header = precipitation_table_header[1:]
-    precipitation_table_rows = precipitation_table.find_all('tr')
-    all_rows_list = []
-    for eachTableRow in precipitation_table_rows:
-        this_row = []
-        for td in eachTableRow.find_all("td"):
-            this_row.append(td.text.strip())
-
-        if this_row and len(this_row) > 1:
-            all_rows_list.append(this_row)
 
-    df = pd.DataFrame(all_rows_list)
+    df = pd.DataFrame(get_html_table_rows(precipitation_table))
     df.columns = precipitation_table_header
     months = ['OCT', 'NOV', 'DEC', 'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP']
-    for col in months:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    df['AVERAGE_YEARLY_PRECIPITATION'] = df[months].mean(axis='columns')
-    df['YEAR'] = year
-    df.rename(columns={"STATION ID": "STATION_ID", "STATION NAME": "STATION_NAME"}, inplace=True)
-    df.drop(columns=months, inplace=True)
-    return df
+    # All the monthly values are converted to numbers in a single call on the flattened array of the month columns.
+    # The yearly average then skips the missing months, as pandas mean does, and is NaN when all months are missing
+    monthly_precipitations = pd.to_numeric(df[months].to_numpy().ravel(), errors='coerce').reshape(len(df), len(months))
+    is_measured = ~np.isnan(monthly_precipitations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average_precipitations = np.where(is_measured, monthly_precipitations, 0).sum(axis=1) / is_measured.sum(axis=1)
+    # Only the yearly average of the months is used downstream. The returned dataframe is built directly with the
+    # used columns, so the monthly and other scraped columns are never carried into the concatenation of all the
+    # years
+    return pd.DataFrame({
+        "STATION_ID": df["STATION ID"],
+        "STATION_NAME": df["STATION NAME"],
+        "AVERAGE_YEARLY_PRECIPITATION": average_precipitations,
+        "YEAR": year
+    })
 
 
 def download_monthly_precipitation_data(
@@ -481,30 +733,39 @@ def download_monthly_precipitation_data(
     :param precipitation_datafile: the file to save the precipitation data to.
     :param year_start: the year to start scraping the data from.
     """
-    all_years_precipitation_data = pd.DataFrame()
     current_year = datetime.now().year
     print(f"Scraping the {year_start}-{current_year-1} precipitation measurements data from the web. Please wait...")
-    # We use threading to load the data in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        precipitations = list(tqdm(executor.map(scrape_precipitation_data_per_year, range(year_start, current_year)),
-                                   total=current_year-year_start))
-    for each_precipitation_data in precipitations:
-        if not each_precipitation_data.empty:
-            all_years_precipitation_data = pd.concat([all_years_precipitation_data, each_precipitation_data], axis=0)
-    all_years_precipitation_data.reset_index(drop=True, inplace=True)
+    # The scraped pages are cached next to the precipitation data so that a repeated download does not scrape the
+    # past years again
+    cache_dir = os.path.join(os.path.dirname(precipitation_datafile), ".cache")
+    # We use threading to load the data in parallel. There are only a few years, so they are all requested at once
+    # through the session of the module to reuse the HTTP connections
+    years = list(range(year_start, current_year))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(years), 10)) as executor:
+        precipitations = list(tqdm(executor.map(scrape_precipitation_data_per_year, years,
+                                                [HTTP_SESSION] * len(years), [cache_dir] * len(years)),
+                                   total=len(years)))
+    # The years with data are concatenated at once, instead of copying the growing dataframe for each year
+    all_years_precipitation_data = pd.concat([each_precipitation_data for each_precipitation_data in precipitations
+                                              if not each_precipitation_data.empty], axis=0, ignore_index=True)
     # Save the file for future direct loading
     os.makedirs(os.path.dirname(precipitation_datafile), exist_ok=True)
-    all_years_precipitation_data.to_csv(precipitation_datafile, index=False)
+    write_csv_file(all_years_precipitation_data, precipitation_datafile)
+    # The typed columns are also stored in a Parquet file next to the CSV file, which the PrecipitationDataset loads
+    # instead of parsing the CSV file
+    all_years_precipitation_data.to_parquet(os.path.splitext(precipitation_datafile)[0] + ".parquet",
+                                            compression="zstd", index=False)
     print("Download complete.")
 
 
-def scrape_precipitation_station_data(level: str, station_features: List[str]) -> pd.DataFrame:
+def scrape_precipitation_station_data(level: str, station_features: List[str], cache_dir: str = None) -> pd.DataFrame:
     """This function scrapes the web for daily or monthly precipitation station data in order to retrieve all
     the weather station geospatial information.
 
     :param level: the level ("daily" ot "monthly") at which to gather precipitation data in order to extract the
     geospatial data of the stations
     :param station_features: the list of features to extract from the stations.
+    :param cache_dir: an optional directory where to cache the HTML pages. They are revalidated every day.
     :return: the precipitation stations geospatial data
     """
     print(f"Scraping the {level} precipitation stations data from the web. Please wait...")
@@ -513,25 +774,15 @@ def scrape_precipitation_station_data(level: str, station_features: List[str]) -
     else:
         url = "https://cdec.water.ca.gov/reportapp/javareports?name=MonthlyPrecip"
     # Make a GET request to fetch the raw HTML content
-    html_content = requests.get(url).text
-    # Parse the html content
+    html_content = get_url_content(url, cache_dir=cache_dir, cache_ttl=CDEC_CACHE_TTL)
+    # Parse the html content directly with lxml
     # Note: Developer tools in Chrome will inform you of the element type and element names to be retrieved.
-    soup = BeautifulSoup(html_content, "lxml")
-
     if level == "daily":
-        station_table = soup.find("table", attrs={"id": "DLY_STNLIST", "class": "data"})
+        station_table = find_html_table(html_content, "DLY_STNLIST")
     else:
-        station_table = soup.find("table", attrs={"id": "REALPRECIP_LIST", "class": "data"})
+        station_table = find_html_table(html_content, "REALPRECIP_LIST")
 
-    all_rows_list = []
-    for eachRow in station_table.find_all("tr"):
-        this_row = []
-        for td in eachRow.find_all("td"):
-            this_row.append(td.text.strip())
-
-        if this_row and len(this_row) > 1:
-            all_rows_list.append(this_row)
-    station_table = pd.DataFrame(all_rows_list)
+    station_table = pd.DataFrame(get_html_table_rows(station_table))
     station_table.columns = station_table.iloc[0, :]
     station_table = station_table.iloc[2:, :].copy()
     station_table.rename(columns={"ID": "STATION_ID"}, inplace=True)
@@ -549,23 +800,26 @@ def download_precipitation_stations_geospatial_data(
     :param precipitation_stationfile: the file to save the precipitation stations geospatial data to.
     """
     station_features = ["STATION", "STATION_ID", "LATITUDE", "LONGITUDE", "COUNTY"]
-    daily_station_data = scrape_precipitation_station_data("daily", station_features)
-    monthly_station_data = scrape_precipitation_station_data("monthly", station_features)
-
-    all_stations_data = pd.concat([daily_station_data, monthly_station_data], axis=0)
-    all_stations_data = all_stations_data.groupby(station_features).agg(
-        count_latitude=('LATITUDE', 'count')).reset_index()
-    all_stations_data.drop(columns=["count_latitude"], inplace=True)
+    # The scraped pages are cached next to the stations file
+    cache_dir = os.path.join(os.path.dirname(precipitation_stationfile), ".cache")
+    daily_station_data = scrape_precipitation_station_data("daily", station_features, cache_dir)
+    monthly_station_data = scrape_precipitation_station_data("monthly", station_features, cache_dir)
+
+    # The stations listed at both levels are only kept once
+    all_stations_data = pd.concat([daily_station_data, monthly_station_data], axis=0).drop_duplicates(
+        subset=station_features, ignore_index=True)
+    # The scraped coordinates are converted to float arrays once, from which the points are built in one vectorized
+    # call
     all_stations_geodf = gpd.GeoDataFrame(
         all_stations_data,
         geometry=gpd.points_from_xy(
-            all_stations_data.LONGITUDE,
-            all_stations_data.LATITUDE
+            all_stations_data.LONGITUDE.to_numpy(dtype=np.float64),
+            all_stations_data.LATITUDE.to_numpy(dtype=np.float64)
         ),
         crs="epsg:4326")
     # Save the file for future direct loading
     os.makedirs(os.path.dirname(precipitation_stationfile), exist_ok=True)
-    all_stations_geodf.to_file(precipitation_stationfile, index=False)
+    write_geospatial_file(all_stations_geodf, precipitation_stationfile)
     print("Download complete.")
 
 
@@ -575,10 +829,8 @@ def download_sjv_shapefile(sjv_shapefile: str = "../assets/inputs/common/plss_su
     :param sjv_shapefile: the file to save the San Joaquin Valley shapefile to.
     """
     url = "https://github.com/datadesk/groundwater-analysis/raw/main/data/plss_subbasin.geojson"
-    geofile_content = requests.get(url).content
     os.makedirs(os.path.dirname(sjv_shapefile), exist_ok=True)
-    with open(sjv_shapefile, "wb") as f:
-        f.write(geofile_content)
+    download_file(url, sjv_shapefile)
 
 
 def download_ca_shapefile(
@@ -611,9 +863,7 @@ def download_crops_datasets(input_geodir: str = "../assets/inputs/crops",
         download_and_extract_zip_file(url=url_base + url, extract_dir=os.path.join(input_geodir, dataset_name))
     print("Downloading the crops name-to-type mapping from GitHub repository. Please wait...")
     url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/crops/crop_name_to_type_mapping.json"
-    file_content = requests.get(url).text
-    with open(crop_name_to_type_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(url, crop_name_to_type_file)
 
 
 def download_groundwater_datasets(input_dir: str = "../assets/inputs/groundwater") -> None:
@@ -622,14 +872,18 @@ def download_groundwater_datasets(input_dir: str = "../assets/inputs/groundwater
 
     :param input_dir: the path where to store the datasets
     """
-    print("Downloading the groundwater measurements dataset. Please wait...")
+    print("Downloading the groundwater measurements and stations datasets. Please wait...")
     measurements_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/groundwater/" \
                        "groundwater_measurements.zip"
-    download_and_extract_zip_file(url=measurements_url, extract_dir=input_dir)
-    print("Downloading the groundwater stations dataset. Please wait...")
     stations_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/groundwater/" \
                    "groundwater_stations.zip"
-    download_and_extract_zip_file(url=stations_url, extract_dir=input_dir)
+    # The downloads are network bound, so both datasets are downloaded at the same time
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(download_and_extract_zip_file, url=url, extract_dir=input_dir)
+                   for url in [measurements_url, stations_url]]
+        # Raise any download error
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
 
 
 def download_population_datasets(
@@ -644,9 +898,7 @@ def download_population_datasets(
     print("Downloading the pre-packaged 2014-2020 California Census population estimates at the Tract level."
           " Please wait...")
     url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/population/population.csv"
-    file_content = requests.get(url).text
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(url, input_datafile)
     print("Downloading the geospatial data of the population census Tracts. Please wait...")
     tract_url = "https://www2.census.gov/geo/tiger/TIGER2019/TRACT/tl_2019_06_tract.zip"
     download_and_extract_zip_file(url=tract_url, extract_dir=os.path.dirname(tract_geofile))
@@ -664,9 +916,7 @@ def download_precipitation_datasets(
     print("Downloading the pre-packaged reservoir dataset. Please wait...")
     url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/precipitation/" \
           "precipitation_data.csv"
-    file_content = requests.get(url).text
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(url, input_datafile)
     print("Downloading the geospatial data of the reservoir dataset. Please wait...")
     tract_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/precipitation/" \
                 "precipitation_map.zip"
@@ -684,9 +934,7 @@ def download_reservoir_datasets(
     os.makedirs(os.path.dirname(input_datafile), exist_ok=True)
     print("Downloading the pre-packaged reservoir dataset. Please wait...")
     url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/reservoir/reservoir_data.csv"
-    file_content = requests.get(url).text
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(url, input_datafile)
     print("Downloading the geospatial data of the reservoir dataset. Please wait...")
     tract_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/reservoir/reservoir_map.zip"
     download_and_extract_zip_file(url=tract_url, extract_dir=os.path.dirname(input_stationfile))
@@ -701,9 +949,7 @@ def download_water_shortage_dataset(input_datafile: str = "../assets/inputs/shor
     shortage_url = "https://data.cnra.ca.gov/dataset/2cf184d1-2d34-46cc-8bb0-1dec86b6caf6/resource/" \
                    "e1fd9f48-a613-4567-8042-3d2e064d77c8/download/householdwatersupplyshortagereporting" \
                    "systemdata.csv"
-    shortage_content = requests.get(shortage_url).text
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(shortage_content)
+    download_file(shortage_url, input_datafile)
 
 
 def download_soils_datasets(input_geodir: str = "../assets/inputs/soils/map/",
@@ -717,17 +963,13 @@ def download_soils_datasets(input_geodir: str = "../assets/inputs/soils/map/",
     os.makedirs(input_geodir, exist_ok=True)
     print("Downloading soil dataset from GitHub repository. Please wait...")
     data_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/soils/soil_data.csv"
-    datafile_content = requests.get(data_url).text
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(datafile_content)
+    download_file(data_url, input_datafile)
     print("Downloading soil geospatial dataset from GitHub repository. Please wait...")
     geofile_baseurl = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/soils/map/"
     files_basename = "gsmsoilmu_a_ca."
     extensions = ["dbf", "prj", "shp", "shx"]
     for ext in extensions:
-        geofile_content = requests.get(geofile_baseurl + files_basename + ext).content
-        with open(os.path.join(input_geodir, files_basename + ext), "wb") as f:
-            f.write(geofile_content)
+        download_file(geofile_baseurl + files_basename + ext, os.path.join(input_geodir, files_basename + ext))
 
 
 def download_vegetation_datasets(
@@ -750,9 +992,7 @@ def download_vegetation_datasets(
     print("Downloading the vegetation cover-type-to-name mapping from GitHub repository. Please wait...")
     url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/vegetation/" \
           "saf_cover_type_mapping.json"
-    file_content = requests.get(url).text
-    with open(cover_type_mapping, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(url, cover_type_mapping)
 
 
 def download_well_completion_datasets(
@@ -766,10 +1006,8 @@ def download_well_completion_datasets(
     print("Downloading the well completion reports dataset. Please wait...")
     welldata_url = "https://data.cnra.ca.gov/dataset/647afc02-8954-426d-aabd-eff418d2652c/resource/" \
                    "8da7b93b-4e69-495d-9caa-335691a1896b/download/wellcompletionreports.csv"
-    file_content = requests.get(welldata_url).text
     os.makedirs(os.path.dirname(input_datafile), exist_ok=True)
-    with open(input_datafile, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(welldata_url, input_datafile)
     print("Downloading the elevation data. Please wait...")
     os.makedirs(elevation_datadir, exist_ok=True)
     elevation_url = "https://github.com/mlnrt/milestone2_waterwells_data/raw/main/well_completion/" \
@@ -792,10 +1030,8 @@ def download_hyperparameter_tuning_results(hpt_results_file: str = "../assets/tu
     :param hpt_results_file: the file name where to store the results of the  hyperparameter tuning analysis"""
     print("Downloading the results of the  hyperparameter tuning analysis. Please wait...")
     hpt_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/ml/hpt_results.csv"
-    file_content = requests.get(hpt_url).text
     os.makedirs(os.path.dirname(hpt_results_file), exist_ok=True)
-    with open(hpt_results_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(hpt_url, hpt_results_file)
 
 
 def download_supervised_learning_artifacts(
@@ -814,34 +1050,24 @@ def download_supervised_learning_artifacts(
     print("Downloading the artifact files from the Supervised Learning Model Training. Please wait...")
     x_train_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                   "train_test_target_shifted/X_train_impute_target_shifted_df.pkl"
-    file_content = requests.get(x_train_url).text
     os.makedirs(os.path.dirname(x_train_file), exist_ok=True)
-    with open(x_train_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(x_train_url, x_train_file)
     x_test_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                  "train_test_target_shifted/X_test_impute_target_shifted_df.pkl"
-    file_content = requests.get(x_test_url).text
     os.makedirs(os.path.dirname(x_test_file), exist_ok=True)
-    with open(x_test_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(x_test_url, x_test_file)
     x_pred_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                  "train_test_target_shifted/X_pred_impute_target_shifted_df.pkl"
-    file_content = requests.get(x_pred_url).text
     os.makedirs(os.path.dirname(x_pred_file), exist_ok=True)
-    with open(x_pred_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(x_pred_url, x_pred_file)
     train_test_dict_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                      "train_test_target_shifted/train_test_dict_target_shifted.pickle"
-    file_content = requests.get(train_test_dict_url).text
     os.makedirs(os.path.dirname(train_test_dic_file), exist_ok=True)
-    with open(train_test_dic_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(train_test_dict_url, train_test_dic_file)
     target_shifted_pca_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                               "train_test_target_shifted/X_target_shifted_pca.pickle"
-    file_content = requests.get(target_shifted_pca_url).text
     os.makedirs(os.path.dirname(target_shifted_pca_file), exist_ok=True)
-    with open(target_shifted_pca_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(target_shifted_pca_url, target_shifted_pca_file)
 
 
 def download_2021_predictions(supervised_predictions_file: str = "../assets/predictions/ml_predictions.csv",
@@ -857,28 +1083,20 @@ def download_2021_predictions(supervised_predictions_file: str = "../assets/pred
     print("Downloading the predictions from the different models. Please wait...")
     supervised_predictions_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/" \
                                  "predictions/ml_predictions.csv"
-    file_content = requests.get(supervised_predictions_url).text
     os.makedirs(os.path.dirname(supervised_predictions_file), exist_ok=True)
-    with open(supervised_predictions_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(supervised_predictions_url, supervised_predictions_file)
     supervised_errors_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/predictions/" \
                            "ml_models_errors.csv"
-    file_content = requests.get(supervised_errors_url).text
     os.makedirs(os.path.dirname(supervised_errors_file), exist_ok=True)
-    with open(supervised_errors_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(supervised_errors_url, supervised_errors_file)
     lstm_predictions_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/predictions/" \
                            "lstm_predictions.csv"
-    file_content = requests.get(lstm_predictions_url).text
     os.makedirs(os.path.dirname(lstm_predictions_file), exist_ok=True)
-    with open(lstm_predictions_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(lstm_predictions_url, lstm_predictions_file)
     lstm_errors_url = "https://milestone2-sanjoaquinvalley-groundwater.s3.eu-west-1.amazonaws.com/predictions/" \
                                "ml_models_errors.csv"
-    file_content = requests.get(lstm_errors_url).text
     os.makedirs(os.path.dirname(lstm_errors_file), exist_ok=True)
-    with open(lstm_errors_file, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    download_file(lstm_errors_url, lstm_errors_file)
 
 
 if __name__ == "__main__":
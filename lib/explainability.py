@@ -1,33 +1,50 @@
 import sys
 sys.path.append('..')
 
-import tempfile
+import io
+import joblib
+import numpy as np
 import shap
 from IPython.core.display import display, HTML
 
+# The explainers and their shap values are cached on disk, keyed on the hash of the model and of the data, so that
+# re-running a notebook does not fit them again. The cache is kept per shap version
+shap_memory = joblib.Memory(f"./.shap_cache/{shap.__version__}", verbose=0)
 
-def show_shap_viz(plot):
-    tmp_output_filename = tempfile.NamedTemporaryFile(suffix='.html').name
-    shap.save_html(tmp_output_filename, plot)
 
-    f = open(tmp_output_filename, "r", encoding='UTF-8')
-    data = f.read()
-    display(HTML(data))
+def show_shap_viz(plot):
+    # shap.save_html accepts a file-like object, so the HTML is rendered in memory instead of a temporary file
+    html_buffer = io.StringIO()
+    shap.save_html(html_buffer, plot)
+    display(HTML(html_buffer.getvalue()))
 
 def get_explainer_shap(model, data):
     print(type(model).__name__)
+    return _get_explainer_shap(model, data)
+
+def get_kernel_explainer_shap(model, data):
+    print(type(model).__name__)
+    return _get_kernel_explainer_shap(model, data)
+
+def get_tree_explainer_shap(model, data):
+    print(type(model).__name__)
+    return _get_tree_explainer_shap(model, data)
+
+# The model name is printed outside of the cached functions, which do not run on cache hits
+@shap_memory.cache
+def _get_explainer_shap(model, data):
     explainer = shap.Explainer( model)
     shap_values = explainer.shap_values(data)
     return explainer, shap_values
 
-def get_kernel_explainer_shap(model, data):
-    print(type(model).__name__)
+@shap_memory.cache
+def _get_kernel_explainer_shap(model, data):
     explainer = shap.KernelExplainer( model.predict, data)
     shap_values = explainer.shap_values(data)
     return explainer, shap_values
 
-def get_tree_explainer_shap(model, data):
-    print(type(model).__name__)
+@shap_memory.cache
+def _get_tree_explainer_shap(model, data):
     explainer = shap.TreeExplainer( model)
     shap_values = explainer.shap_values(data)
     return explainer, shap_values
@@ -51,11 +68,22 @@ def create_over_under_pred(model, y_pred, explainer, X_test_impute_df, under_pre
     plot = shap.force_plot(explainer.expected_value, over_prediction_shap_values, feature_names=X_test_impute_df.columns)
     show_shap_viz(plot)
 
-def create_over_under_pred_multiple_samples(model, y_pred, explainer, X_test_impute_df, num_samples):
+def get_batched_shap_values(explainer, values, batch_size: int = 64):
+    """Computes the shap values of the rows in values by batches of batch_size rows, so that only one batch of
+    perturbation samples is held in memory at a time"""
+    n_batches = max(1, int(np.ceil(len(values) / batch_size)))
+    shap_values = [explainer.shap_values(batch) for batch in np.array_split(values, n_batches)]
+    # Multi-output explainers return a list with the shap values of each output, which are concatenated output by output
+    if isinstance(shap_values[0], list):
+        return [np.concatenate([batch_values[k] for batch_values in shap_values], axis=0)
+                for k in range(len(shap_values[0]))]
+    return np.concatenate(shap_values, axis=0)
+
+def create_over_under_pred_multiple_samples(model, y_pred, explainer, X_test_impute_df, num_samples, batch_size: int = 64):
         under_prediction_values  =  X_test_impute_df.loc[y_pred.index.get_level_values(0)[0:num_samples]].values
         over_prediction_values  =  X_test_impute_df.loc[y_pred.index.get_level_values(0)[-num_samples:]].values
-        under_prediction_shap_values = explainer.shap_values(under_prediction_values)
-        over_prediction_shap_values = explainer.shap_values(over_prediction_values)
+        under_prediction_shap_values = get_batched_shap_values(explainer, under_prediction_values, batch_size)
+        over_prediction_shap_values = get_batched_shap_values(explainer, over_prediction_values, batch_size)
 
         print(f"Model : {model} under prediction")
         plot = shap.force_plot(explainer.expected_value, under_prediction_shap_values, feature_names=X_test_impute_df.columns)
@@ -1,6 +1,10 @@
 import os
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 
 from datetime import datetime
 from typing import List
@@ -10,6 +14,9 @@ from lib.download import download_groundwater_datasets
 
 class GroundwaterDataset(WsGeoDataset):
     """This class loads, processes and exports the Well Completion Reports dataset"""
+    # Only these features of the groundwater measurements dataset are used
+    measurement_features = ["SITE_CODE", "GSE_GWE", "MSMT_DATE"]
+
     def __init__(self, groundwater_dir: str = "../assets/inputs/groundwater"):
         input_measurements_file = os.path.join(groundwater_dir, "groundwater_measurements.csv")
         input_stations_file = os.path.join(groundwater_dir, "groundwater_stations.csv")
@@ -31,17 +38,38 @@ class GroundwaterDataset(WsGeoDataset):
                          merging_keys=["SITE_CODE", "SITE_CODE"])
         # Initializes the Geospatial map_df dataset based on the LATITUDE & LONGITUDE features of the
         # groundwater_stations dataset
-        groundwaterstations_df = pd.read_csv(input_stations_file)
+        # pyarrow tokenizes and converts the CSV file with several threads
+        groundwaterstations_df = pv.read_csv(input_stations_file).to_pandas()
+        # Set the coordinate reference system so that we now have the projection axis
         self.map_df = gpd.GeoDataFrame(
             groundwaterstations_df,
-            geometry=gpd.points_from_xy(
-                groundwaterstations_df.LONGITUDE,
-                groundwaterstations_df.LATITUDE
-            ))
-        # Set the coordinate reference system so that we now have the projection axis
-        self.map_df = self.map_df.set_crs("epsg:4326")
+            geometry=gpd.points_from_xy(groundwaterstations_df["LONGITUDE"], groundwaterstations_df["LATITUDE"]),
+            crs="epsg:4326")
         print("Loading of datasets complete.")
 
+    def _read_input_datafile(self, input_datafile: str, input_datafile_format: str = "csv") -> pd.DataFrame:
+        """This functions loads only the used features of the groundwater measurements dataset. The first time the
+        measurements CSV file is read, it is converted into a Parquet file next to it, which is used to load the
+        measurements faster the next times.
+
+        :param input_datafile: the path to the groundwater measurements CSV file
+        :param input_datafile_format: the format of the input_datafile. Not used, the measurements are in a CSV file
+        :return: the pandas DataFrame containing the groundwater measurements
+        """
+        parquet_file = os.path.splitext(input_datafile)[0] + ".parquet"
+        if os.path.exists(parquet_file) and (not os.path.exists(input_datafile) or
+                                             os.path.getmtime(parquet_file) >= os.path.getmtime(input_datafile)):
+            return pd.read_parquet(parquet_file, columns=self.measurement_features)
+        # The measurements do not need a double precision and the site codes are repeated on many rows, so they are
+        # loaded as float32 and dictionary encoded (category) to reduce the memory footprint. pyarrow tokenizes and
+        # converts the CSV file with several threads and the declared column types spare the type inference
+        table = pv.read_csv(input_datafile, convert_options=pv.ConvertOptions(
+            include_columns=self.measurement_features,
+            column_types={"SITE_CODE": pa.dictionary(pa.int32(), pa.string()), "GSE_GWE": pa.float32(),
+                          "MSMT_DATE": pa.string()}))
+        pq.write_table(table, parquet_file, compression="zstd")
+        return table.to_pandas(self_destruct=True)
+
     def _download_datasets(self, groundwater_dir: str):
         """This function downloads the groundwater measurements dataset and the groundwater stations dataset from the
         web.
@@ -52,31 +80,63 @@ class GroundwaterDataset(WsGeoDataset):
         download_groundwater_datasets(groundwater_dir)
         print("Downloads complete.")
 
-    def preprocess_data_df(self, features_to_keep: List[str], min_year: int = 2014):
+    def _parse_msmt_date(self) -> pd.Series:
+        """This function parses the MSMT_DATE measurement dates. All the dates share the same format so the format is
+        inferred once from the first date and the fast parsing path is used for the whole column. The many repeated
+        dates are only converted once.
+
+        :return: the measurement dates as a datetime Series
+        """
+        return pd.to_datetime(self.data_df["MSMT_DATE"], infer_datetime_format=True, cache=True)
+
+    def export_short(self, output_file: str = "../assets/inputs/groundwater/groundwater_short.parquet",
+                     min_year: int = 2014, msmt_date: pd.Series = None):
+        """This function exports all the measurements from min_year onwards in a shorter Parquet file. It must be
+        called before preprocess_data_df() which filters the measurements.
+
+        :param output_file: the path to the exported file.
+        :param min_year: the minimum year to keep.
+        :param msmt_date: the already parsed measurement dates, if any, so that they are not parsed again.
+        """
+        if msmt_date is None:
+            msmt_date = self._parse_msmt_date()
+        self.data_df[msmt_date.dt.year >= min_year].assign(MSMT_DATE=msmt_date).to_parquet(output_file,
+                                                                                            compression="zstd")
+
+    def preprocess_data_df(self, features_to_keep: List[str], min_year: int = 2014, cache_short: bool = False,
+                           short_file: str = "../assets/inputs/groundwater/groundwater_short.parquet"):
         """This function keeps the GSE_GWE feature for the spring months.
         :param features_to_keep: the list of features (columns) to keep.
         :param min_year: the minimum year to keep.
+        :param cache_short: whether to export all the measurements from min_year onwards in the short_file, if it does
+        not exist yet, before filtering the data.
+        :param short_file: the path to the file where to export the measurements from min_year onwards.
         """
-        # create simple year and month columns
-        self.data_df["MSMT_DATE"] = pd.to_datetime(self.data_df.MSMT_DATE)
-        self.data_df["YEAR"] = self.data_df["MSMT_DATE"].dt.year
-        df = self.data_df.copy()
-        df = df[df.YEAR >= min_year]
-        df.drop(columns=["YEAR"], inplace=True)
-        df.to_csv("../assets/inputs/groundwater/groundwater_short.csv")
-        self.data_df["MONTH"] = self.data_df["MSMT_DATE"].dt.month
-        # Retain only those records that have Groundwater measurements
-        self.data_df = self.data_df[~self.data_df["GSE_GWE"].isnull()] # 2325741
-        # drop the rows that have incorrect measurements that of 0 or less
-        self.data_df = self.data_df[self.data_df["GSE_GWE"] > 0]
-        # filter for just the spring measurements
-        spring_months = [1, 2, 3, 4]
-        self.data_df = self.data_df[self.data_df["MONTH"].isin(spring_months)]
-        # Keep only the necessary features
-        self.data_df = self.data_df[features_to_keep]
-        # Keep only the data after min_year and before the current year
-        current_year = datetime.now().year
-        self.data_df = self.data_df[(self.data_df["YEAR"] >= min_year) & (self.data_df["YEAR"] < current_year)]
+        # The dates are parsed only once, for both the export and the year and month columns
+        msmt_date = self._parse_msmt_date()
+        if cache_short and not os.path.exists(short_file):
+            self.export_short(short_file, min_year, msmt_date)
+        # create simple year and month arrays. The missing dates (NaT) give a NaN year and month, which cannot be cast
+        # to integers, so they are set to 0 first. The rows without a date are excluded explicitly by the mask below
+        year = msmt_date.dt.year.fillna(0).to_numpy(dtype=np.int16)
+        month = msmt_date.dt.month.fillna(0).to_numpy(dtype=np.int8)
+        # Filter all the rows at once. We retain only
+        # * the measurements with a date
+        # * the spring measurements
+        # * the records that have Groundwater measurements, dropping the incorrect measurements of 0 or less
+        # * the data after min_year and before the current year
+        # NaN > 0 is False, so a single comparison drops both the missing and the incorrect measurements. The spring
+        # months (January to April) are a contiguous range, a comparison is cheaper than a membership test.
+        # The whole mask is evaluated as one expression over the raw arrays, in a single fused pass by the
+        # multi-threaded numexpr engine when it is installed
+        mask = pd.eval("HAS_DATE & (MONTH <= 4) & (GSE_GWE > 0) & (YEAR >= min_year) & (YEAR < current_year)",
+                       local_dict={"HAS_DATE": msmt_date.notna().to_numpy(), "MONTH": month,
+                                   "GSE_GWE": self.data_df["GSE_GWE"].to_numpy(), "YEAR": year,
+                                   "min_year": min_year, "current_year": datetime.now().year})
+        # Keep only the necessary features. The new columns are filtered with the same mask and assigned as arrays,
+        # without being aligned again on the index of the filtered rows
+        self.data_df = self.data_df[mask].assign(MSMT_DATE=msmt_date.to_numpy()[mask], YEAR=year[mask],
+                                                 MONTH=month[mask])[features_to_keep]
 
     def preprocess_map_df(self, features_to_keep: List[str]):
         """This function keeps only the features in the features_to_keep list from the original geospatial data.
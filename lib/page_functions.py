@@ -32,9 +32,28 @@ def set_bg_image_url():
 
 @st.cache(allow_output_mutation=True)
 def get_base64_of_bin_file(bin_file):
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+    '''
+    A function to get the base64 encoding of a binary file.
+    The encoding is stored in a .b64 file next to the binary file and read back from it by the next processes,
+    as long as the binary file has not changed since.
+    Returns
+    -------
+    The base64 encoded content of the file.
+    '''
+    bin_path = Path(bin_file)
+    b64_path = bin_path.with_name(bin_path.name + ".b64")
+    if b64_path.exists() and b64_path.stat().st_mtime >= bin_path.stat().st_mtime:
+        return b64_path.read_text()
+    data = base64.b64encode(bin_path.read_bytes()).decode()
+    # Write to a temporary file first so that a concurrent session never reads a partial encoding. The cache is
+    # optional, the page still works if the images folder is read-only
+    try:
+        tmp_path = b64_path.with_name(b64_path.name + ".tmp")
+        tmp_path.write_text(data)
+        tmp_path.replace(b64_path)
+    except OSError:
+        pass
+    return data
 
 def set_png_as_page_bg(png_file):
     bin_str = get_base64_of_bin_file(png_file)
@@ -1,5 +1,9 @@
+import os
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow as pa
+import pyarrow.csv as pv
 
 from typing import List
 from fiona.errors import DriverError
@@ -32,8 +36,20 @@ class PopulationDataset(WsGeoDataset):
         print("Loading local datasets. Please wait...")
         super().__init__(input_geofiles=[tract_geofile], input_datafile=input_datafile,
                          merging_keys=["TRACT_ID", "TRACT_ID"])
+        self.tract_geofile = tract_geofile
         print("Loading of datasets complete.")
 
+    def _read_input_datafile(self, input_datafile: str, input_datafile_format: str = "csv") -> pd.DataFrame:
+        """This functions loads the population estimates. pyarrow tokenizes and converts the CSV file with several
+        threads. The TRACT_ID is read as a 64-bit integer, whether or not the file kept the leading 0 of the Tract ids.
+
+        :param input_datafile: the path to the population CSV file
+        :param input_datafile_format: the format of the input_datafile. Not used, the population is in a CSV file
+        :return: the pandas DataFrame containing the population estimates
+        """
+        return pv.read_csv(input_datafile, convert_options=pv.ConvertOptions(
+            column_types={"TRACT_ID": pa.int64()})).to_pandas()
+
     def _download_datasets(self, input_datafile: str, tract_geofile: str):
         """This function downloads the population datasets from the web
 
@@ -49,8 +65,18 @@ class PopulationDataset(WsGeoDataset):
 
         :param features_to_keep: the list of features (columns) to keep.
         """
-        self.map_df = gpd.clip(self.map_df, self.ca_boundaries.geometry[0])
-        self.map_df["TRACT_ID"] = self.map_df["STATEFP"] + self.map_df["COUNTYFP"] + self.map_df["TRACTCE"]
+        # Clipping all the Tracts to the California boundaries is slow. The clipped Tracts are stored in a GeoParquet
+        # file next to the Tracts shapefile so that the clip is only computed again when the shapefile changes
+        clipped_file = os.path.splitext(self.tract_geofile)[0] + "_clipped.parquet"
+        if os.path.exists(clipped_file) and os.path.getmtime(clipped_file) >= os.path.getmtime(self.tract_geofile):
+            self.map_df = gpd.read_parquet(clipped_file)
+        else:
+            self.map_df = gpd.clip(self.map_df, self.ca_boundaries.geometry[0])
+            self.map_df.to_parquet(clipped_file)
+        # The three parts of the Tract id are concatenated in a single pass. The ids are then converted to integers,
+        # as in the population data, so that the Tracts are merged on 64-bit integer keys instead of strings
+        self.map_df["TRACT_ID"] = self.map_df["STATEFP"].str.cat(
+            [self.map_df["COUNTYFP"], self.map_df["TRACTCE"]]).astype(np.int64)
         self.map_df = self.map_df[features_to_keep]
 
     def preprocess_data_df(self):
@@ -67,8 +93,6 @@ class PopulationDataset(WsGeoDataset):
             trend_df["TREND"] = 1 + ((trend_df[year] - trend_df[year-1]) / trend_df[year-1])
             return trend_df
 
-        self.data_df["TRACT_ID"] = self.data_df["TRACT_ID"].astype(str)
-        self.data_df["TRACT_ID"] = "0" + self.data_df["TRACT_ID"]
         # Now that we have all data we compute the population density per year and tract
         self.data_df["POPULATION_DENSITY"] = self.data_df["TOTAL_POPULATION"] / self.data_df["LAND_AREA"]
         self.data_df = self.data_df[["TRACT_ID", "POPULATION_DENSITY", "YEAR"]]
@@ -3,6 +3,7 @@ sys.path.append('..')
 
 import os
 import pickle
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -10,10 +11,17 @@ from lib.viz import display_data_on_map, simple_geodata_viz
 from lib.township_range import TownshipRanges
 from lib.supervised_tuning import read_target_shifted_data
 
+# The predictions of the saved models, stored by get_geo_prediction_df. The path of this file is relative to the
+# supervised_learning.py page
+PREDICTION_VALUES_FILE = "./pages/prediction_values.csv"
+# The saved supervised learning models applied by get_predictions_df
+MODELS_FILE = "../assets/models/supervised_learning_models/models.pickle"
 
-
+@lru_cache(maxsize=1)
 def get_predictions_df():
     """This function applies saved models on the prediction dataset and returns predictions for all TRs for prediction year 2021
+       The saved models and data do not change while the application runs, so the predictions are only computed once per
+       process. The returned dataframe is shared and must not be modified
      
         :param None
         :output: a  dataframe with columns for Year = 2021, TOWNSHIP_RANGE and columns for the predictions from each of the models
@@ -34,13 +42,14 @@ def get_predictions_df():
     test_year_list = list(X_test_impute_df.index.get_level_values('YEAR').unique())
     pred_year_list = [int(year) + 1 for year in test_year_list]
  
-    with open('../assets/models/supervised_learning_models/models.pickle', 'rb') as file:
+    with open(MODELS_FILE, 'rb') as file:
             models = pickle.load(file)
-    for model in models:
-        regressor_name = type(model.best_estimator_.regressor_).__name__ 
-        y_pred_df[regressor_name] = model.best_estimator_.predict(X_pred_impute)
-  
-    y_pred_df.drop(columns=['GSE_GWE_SHIFTED'], inplace=True)
+    # The predictions of all the models are stacked in a single array and added to the dataframe at once, instead of
+    # inserting a new column in the dataframe for each model
+    regressor_names = [type(model.best_estimator_.regressor_).__name__ for model in models]
+    predictions_df = pd.DataFrame(np.column_stack([model.best_estimator_.predict(X_pred_impute) for model in models]),
+                                  columns=regressor_names, index=y_pred_df.index)
+    y_pred_df = pd.concat([y_pred_df.drop(columns=['GSE_GWE_SHIFTED']), predictions_df], axis=1)
     y_pred_df.reset_index(inplace=True)
     return y_pred_df
 
@@ -57,13 +66,20 @@ def get_geo_prediction_df():
     township_range = TownshipRanges()
     county_tr_mapping = township_range.counties_and_trs_df
    
-    # The path of this file is relative to the supervised_learning.py page
-    if os.path.exists("./pages/prediction_values.csv"):
-        y_pred_df = pd.read_csv("./pages/prediction_values.csv", dtype={'YEAR':str, 'XGBRegressor': np.float64, 'SVR': np.float64,
+    # The stored predictions are only used as long as they are not older than the saved models
+    if os.path.exists(PREDICTION_VALUES_FILE) and (not os.path.exists(MODELS_FILE) or
+                                                   os.path.getmtime(PREDICTION_VALUES_FILE) >= os.path.getmtime(MODELS_FILE)):
+        y_pred_df = pd.read_csv(PREDICTION_VALUES_FILE, dtype={'YEAR':str, 'XGBRegressor': np.float64, 'SVR': np.float64,
                     'KNeighborsRegressor': np.float64, 'GradientBoostingRegressor': np.float64,
                     'CatBoostRegressor': np.float64})
     else:
         y_pred_df = get_predictions_df()
+        # Store the predictions so that the next runs read them instead of loading and applying the models again. The
+        # file is only a cache, the predictions are still returned if it cannot be written
+        try:
+            y_pred_df.to_csv(PREDICTION_VALUES_FILE, index=False)
+        except OSError:
+            pass
     
     y_pred_df = county_tr_mapping.merge(y_pred_df, left_on='TOWNSHIP_RANGE', right_on='TOWNSHIP_RANGE') 
     return y_pred_df
@@ -107,9 +123,11 @@ def draw_predictions_for_model(gdf:gpd.GeoDataFrame, model_name: str,county_name
         :param : gdf : Dataframe with counties, township ranges and model predictions
         :output: visualization of the predictions as an Altair chart
     """
-    new_df = gdf.copy()
+    # Only the predictions column is rebuilt. assign shares all the other columns, including the geometries, with gdf
+    # instead of deep copying them
+    new_df = gdf
     if county_name != 'All':
-        new_df[model_name] = np.where(new_df['COUNTY'] != county_name, 0, new_df[model_name])
+        new_df = gdf.assign(**{model_name: gdf[model_name].where(gdf['COUNTY'] == county_name, 0)})
     return simple_geodata_viz(new_df, feature= model_name, title='Prediction for county township ranges', year='2021',
                    color_scheme= 'blues',
                    draw_stations = False)
\ No newline at end of file
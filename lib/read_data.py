@@ -1,6 +1,9 @@
 import os
+import concurrent.futures
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 
 
 # Pick out the csv files that form inidividual features from the assets folder
@@ -12,12 +15,19 @@ def read_feature_files(folder_name: str = "../assets/outputs/"):
         :output: a dictionary with dataframe names as key and 
                  the dataframe as value
     """
-    output_files_dict = dict()
+    output_files = [output_file for output_file in os.listdir(folder_name)
+                    if output_file != "california_weekly_drought_index.csv" and output_file.endswith(".csv")]
 
-    for output_file in os.listdir("../assets/outputs/"):
-        if output_file != "california_weekly_drought_index.csv" and output_file.endswith(".csv"):
-            output_files_dict[f"{output_file.replace(r'.csv', '')}_df"] = pd.read_csv(rf"{folder_name}{output_file}") 
-    return output_files_dict
+    def read_output_file(output_file: str) -> pd.DataFrame:
+        # pyarrow parses the CSV file in C++ and releases the GIL. The Township-Ranges are always read as strings
+        return pv.read_csv(os.path.join(folder_name, output_file), convert_options=pv.ConvertOptions(
+            column_types={"TOWNSHIP_RANGE": pa.string()})).to_pandas()
+
+    # The files are independent, so they are read in parallel by a pool of threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(output_files), 8) or 1) as executor:
+        output_dfs = executor.map(read_output_file, output_files)
+        return {f"{output_file.replace(r'.csv', '')}_df": output_df
+                for output_file, output_df in zip(output_files, output_dfs)}
 
     
 def read_and_join_output_file(start_year: int = 2014,
@@ -35,37 +45,28 @@ def read_and_join_output_file(start_year: int = 2014,
                     the dict
     """
     feature_df_dict = read_feature_files()
-    left_df = pd.DataFrame()
-    for each_df_name in feature_df_dict.keys():
-        # We are considering the year range from 2014 to 2021 for ML
-        if left_df.empty:
-            # Make the first dataframe the left dataframe, it will be replaced by result of join
-            left_df = feature_df_dict[each_df_name]
-            left_df = left_df[(left_df['YEAR'] >= start_year) & (left_df['YEAR'] <= end_year)].copy()
-            
-            continue
-
-        # Make consecutively arriving dataframes the right dataframe
-        right_df = feature_df_dict[each_df_name]
-        right_df = right_df[(right_df['YEAR'] >= start_year) & (right_df['YEAR'] <= end_year)].copy()
-        
-        join_cols = ['TOWNSHIP_RANGE', 'YEAR']
-        join_type = 'outer'
-        indicator = False
-
-        left_df = left_df.merge(right_df, 
-                                on=join_cols,
-                                how=join_type,
-                                indicator=indicator)
-        
+    # We are considering the year range from 2014 to 2021 for ML
+    # All the dataframes are indexed on the join columns and joined at once by an index-aligned concatenation
+    join_cols = ['TOWNSHIP_RANGE', 'YEAR']
+    indexed_dfs = []
+    for each_df_name, each_df in feature_df_dict.items():
+        each_df = each_df[(each_df['YEAR'] >= start_year) & (each_df['YEAR'] <= end_year)]
+        # The years of all the dataframes are aligned as small integers, whatever the type they were read with
+        each_df = each_df.assign(YEAR=each_df['YEAR'].astype(np.int32)).set_index(join_cols)
+        if not each_df.index.is_unique:
+            raise ValueError(f"The output file {each_df_name[:-len('_df')]}.csv has several rows for the same "
+                             "TOWNSHIP_RANGE and YEAR")
+        indexed_dfs.append(each_df)
+    left_df = pd.concat(indexed_dfs, axis=1, join='outer')
+
     # As see above, TOWNSHIP_RANGE and YEAR are columns for the joins and are essentially 'categorical' columns
     # introduce a feature as a proxy for distance from start of time
     # min_year = np.int32(left_df.YEAR.min())
     # left_df['DURATION'] = left_df['YEAR'].astype('int') - min_year
-    
-    left_df['TOWNSHIP_RANGE'] = left_df['TOWNSHIP_RANGE'].astype('str')
-    left_df['YEAR'] = left_df['YEAR'].astype(int).astype('str')
-    left_df.set_index(['TOWNSHIP_RANGE', 'YEAR'], drop=True, inplace=True)
+
+    # The join columns are already the index. The keys are only converted to strings after the join and only the
+    # distinct values of each level are converted, the rows keep pointing to them through the codes of the MultiIndex
+    left_df.index = left_df.index.set_levels([level.astype('str') for level in left_df.index.levels])
     left_df.sort_index(level=["TOWNSHIP_RANGE", "YEAR"], inplace=True)
     
     return left_df
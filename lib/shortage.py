@@ -25,14 +25,11 @@ class ShortageReportsDataset(WsGeoDataset):
         print("Loading local datasets. Please wait...")
         super().__init__(input_geofiles=[])
         shortage_df = self._clean_shortage_reports(shortage_datafile=input_datafile)
+        # Set the coordinate reference system so that we now have the projection axis
         self.map_df = gpd.GeoDataFrame(
             shortage_df,
-            geometry=gpd.points_from_xy(
-                shortage_df.LONGITUDE,
-                shortage_df.LATITUDE
-            ))
-        # Set the coordinate reference system so that we now have the projection axis
-        self.map_df = self.map_df.set_crs("epsg:4326")
+            geometry=gpd.points_from_xy(shortage_df["LONGITUDE"], shortage_df["LATITUDE"]),
+            crs="epsg:4326")
         print("Loading of datasets complete.")
 
     def _download_datasets(self, input_datafile: str):
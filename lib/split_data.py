@@ -5,12 +5,7 @@ import random
 from itertools import islice
 
 from typing import List, Tuple
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
-from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.pipeline import Pipeline, make_pipeline
-from sklearn.preprocessing import FunctionTransformer, MinMaxScaler
-from sklearn.model_selection import GroupShuffleSplit, TimeSeriesSplit
+from sklearn.model_selection import GroupShuffleSplit
 
 
 def group_split(list_to_split: str, split_ratio: float = 0.8, random_seed: int = 42):
@@ -51,12 +46,24 @@ def train_test_split_single_level_index(df: pd.DataFrame, index_to_split: str =
     return train_df, test_df
 
 
+def _get_values(df: pd.DataFrame, name: str) -> np.ndarray:
+    """This function returns the values of a column or of an index level of the dataframe.
+
+    :param df: the dataframe
+    :param name: the name of the column or of the index level
+    :return: the values of the column or of the index level
+    """
+    if name in df.index.names:
+        return df.index.get_level_values(name).to_numpy()
+    return df[name].to_numpy()
+
+
 def train_test_group_split(df: pd.DataFrame, index: List[str], group: str, test_size: float = 0.2,
                            random_seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """This function splits the dataframe into train and test sets based on the group column
     some group time series will be in the train set and others in the test set.
 
-    :param df: dataframe to be split
+    :param df: dataframe to be split, indexed by the index columns
     :param index: list of index columns
     :param group: the group column name to be used to split the dataframe
     :param test_size: the size in percentage of the test set (e.g. 0.2 f0r 20%)
@@ -64,11 +71,13 @@ def train_test_group_split(df: pd.DataFrame, index: List[str], group: str, test_
     :return: train and test dataframes
     """
     group_splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_seed)
-    X_no_index = df.reset_index(drop=False)
-    split = group_splitter.split(X_no_index, groups=X_no_index[group])
+    # The split only needs the groups of the rows, the rows are then selected by position in df which is already
+    # indexed by the index columns, without resetting and setting back the index
+    groups = _get_values(df, group)
+    split = group_splitter.split(np.empty(len(groups)), groups=groups)
     train_idx, test_idx = next(split)
-    X_train = X_no_index.loc[train_idx].set_index(index, drop=True)
-    X_test = X_no_index.loc[test_idx].set_index(index, drop=True)
+    X_train = df.iloc[train_idx]
+    X_test = df.iloc[test_idx]
     return X_train, X_test
 
 
@@ -76,22 +85,32 @@ def train_test_time_split(df: pd.DataFrame, index: List[str], group: str) -> Tup
     """This function splits the timeseries dataframe into X and y value based on time. The last time point is used
     as the y value and the rest is used as the X value.
 
-    :param df: dataframe to be split
+    :param df: dataframe to be split, indexed by the index columns
     :param index: list of index columns
     :param group: the group column name
     :return: train and test dataframes
     """
-    Xy = df.copy()
-    Xy.reset_index(inplace=True)
-    Xy.sort_values(by=["YEAR"], ascending=True, inplace=True, ignore_index=True)
-    tr_splitter = TimeSeriesSplit(n_splits=2, test_size=len(Xy[group].unique()))
-    split = tr_splitter.split(Xy)
-    next(split)
-    train_idx, test_idx = next(split)
-    X = Xy.loc[train_idx].set_index(index, drop=True)
-    X.sort_index(level=index, inplace=True)
-    y = Xy.loc[test_idx].set_index(index, drop=True)
-    y.sort_index(level=index, inplace=True)
+    # The rows are ordered by YEAR through their positions in df, which is already indexed by the index columns,
+    # without copying df and resetting and setting back its index
+    year_order = np.argsort(_get_values(df, "YEAR"), kind="stable")
+    return _split_last_time_point(df, year_order, _get_values(df, group), index)
+
+
+def _split_last_time_point(df: pd.DataFrame, year_order: np.ndarray, groups: np.ndarray,
+                           index: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """This function splits the rows of the dataframe at the year_order positions into X and y values. There is one
+    row per group for the last time point, so the last rows in the YEAR order, one per group, are used as the y value
+    and the rest is used as the X value.
+
+    :param df: dataframe to be split, indexed by the index columns
+    :param year_order: the positions of the rows to split in df, in increasing YEAR order
+    :param groups: the group of each row of df
+    :param index: list of index columns
+    :return: X and y dataframes
+    """
+    last_size = len(pd.unique(groups[year_order]))
+    X = df.iloc[year_order[:-last_size]].sort_index(level=index)
+    y = df.iloc[year_order[-last_size:]].sort_index(level=index)
     return X, y
 
 
@@ -108,8 +127,15 @@ def train_test_group_time_split(df: pd.DataFrame, index: List[str], group: str,
     :param random_seed: random seed to be used for the split
     :return: X_train, X_test, y_train, y_test dataframes
     """
-    Xy_train, Xy_test = train_test_group_split(df, index=index, group=group, test_size= test_size,
-                                               random_seed=random_seed)
-    X_train, y_train = train_test_time_split(Xy_train, index=index, group=group)
-    X_test, y_test = train_test_time_split(Xy_test, index=index, group=group)
+    # The rows are ordered by YEAR only once. The group split is a mask over the rows which selects the train and
+    # test rows out of that order, so both sets are split on time without being sorted again
+    groups = _get_values(df, group)
+    group_splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_seed)
+    train_idx, _ = next(group_splitter.split(np.empty(len(groups)), groups=groups))
+    is_train = np.zeros(len(groups), dtype=bool)
+    is_train[train_idx] = True
+    year_order = np.argsort(_get_values(df, "YEAR"), kind="stable")
+    is_train_ordered = is_train[year_order]
+    X_train, y_train = _split_last_time_point(df, year_order[is_train_ordered], groups, index)
+    X_test, y_test = _split_last_time_point(df, year_order[~is_train_ordered], groups, index)
     return X_train, X_test, y_train, y_test
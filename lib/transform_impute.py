@@ -88,7 +88,9 @@ def get_column_names_after_transform(
     # The non-transformed columns will be appended on the right of
     # the array and do not show up in the 'transformers_' method.
     # Add the passthrough columns to the col_names manually
-    passthrough_cols = [col for col in X.columns if col not in list_cols_used]
+    # The membership tests are done against a set, the passthrough columns keep their order in X
+    used_cols = frozenset(list_cols_used)
+    passthrough_cols = [col for col in X.columns if col not in used_cols]
     new_col_names += passthrough_cols
     return new_col_names
 
@@ -124,11 +126,40 @@ def convert_back_df(
              s for s in cols_transformer.transformers[i][2]
         ]
 
-    passthrough_cols = [col for col in X.columns if col not in new_col_names]
+    # The membership tests are done against a set, the passthrough columns keep their order in X
+    transformed_cols = frozenset(new_col_names)
+    passthrough_cols = [col for col in X.columns if col not in transformed_cols]
     new_col_names += passthrough_cols
     return pd.DataFrame(X_new, index = X.index, columns=new_col_names)
 
 
+def downcast_float_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """This function casts the double precision columns to single precision. The features do not need a double
+    precision, and single precision halves the memory moved by every following imputation and scaling step.
+
+    :param df: dataframe to be downcast
+    :return: dataframe with the float64 columns cast to float32
+    """
+    return df.astype({col: np.float32 for col in df.select_dtypes(include="float64").columns})
+
+
+def categorize_township_range(df: pd.DataFrame) -> pd.DataFrame:
+    """This function converts the TOWNSHIP_RANGE index level to a categorical. The following groupby, join and
+    reindex operations on the Township-Ranges then work on small integer codes instead of hashing strings.
+
+    :param df: dataframe indexed by TOWNSHIP_RANGE and YEAR
+    :return: dataframe with a categorical TOWNSHIP_RANGE index level
+    """
+    if "TOWNSHIP_RANGE" not in df.index.names:
+        return df
+    level = df.index.names.index("TOWNSHIP_RANGE")
+    if isinstance(df.index, pd.MultiIndex):
+        index = df.index.set_levels(df.index.levels[level].astype("category"), level=level)
+    else:
+        index = df.index.astype("category")
+    return df.set_axis(index, axis=0)
+
+
 def fill_from_prev_year(df: pd.DataFrame):
     """This function fills the vegetation, crops and soils columns with the values from the previous existing years.
     E.g. It fills 2015 data from 2014 and 2017 data from 2016.
@@ -138,26 +169,39 @@ def fill_from_prev_year(df: pd.DataFrame):
     """
     # Separate out the Crops, Vegetation and Soils columns since they have a very specific set of column to borrow from
     # and conditional columns to fill into
-    veg_soil_cols = [col for col in df.columns if col.startswith("VEGETATION_") or col.startswith("SOIL_")]
-    crops_cols = [col for col in df.columns if col.startswith("CROP_") and col not in veg_soil_cols]
+    # The column names are matched against the prefixes with a vectorized scan and keep their order in df
+    columns = df.columns.to_numpy(dtype=str)
+    is_veg_soil = np.char.startswith(columns, "VEGETATION_") | np.char.startswith(columns, "SOIL_")
+    veg_soil_cols = columns[is_veg_soil].tolist()
+    crops_cols = columns[np.char.startswith(columns, "CROP_") & ~is_veg_soil].tolist()
 
     # Crops is filled from the previous year's value
     # Vegetation and Soil on the other hand have a specific year that the value is non-null which has to be
     # used to fill the rest of the years.
-    subset_df = df[veg_soil_cols].copy()
-    value_df = subset_df.groupby(["TOWNSHIP_RANGE"])[veg_soil_cols].mean().reset_index()
-    year_df = pd.DataFrame({"YEAR": subset_df.index.unique(level="YEAR")})
-
-    value_df["key"] = 0
-    year_df["key"] = 0
-
-    value_df = value_df.merge(year_df, on="key", how="outer")
-    value_df.drop(columns=["key"], inplace=True)
-    value_df.set_index(['TOWNSHIP_RANGE', 'YEAR'], drop=True, inplace=True)
+    years = df.index.unique(level="YEAR")
+    # The Township-Ranges are factorized to integer codes and the rows are ordered by code, so that the rows of each
+    # Township-Range are contiguous and their NaN-skipping sums and counts are reduced in one pass over the matrix
+    codes, township_ranges = pd.factorize(df.index.get_level_values("TOWNSHIP_RANGE"), sort=True)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    # The vegetation and soils values are read straight into the array, without an intermediate copy of the columns
+    values = df[veg_soil_cols].to_numpy(dtype=np.float64)[order]
+    is_valid = ~np.isnan(values)
+    starts = np.searchsorted(codes[order], np.arange(len(township_ranges)))
+    sums = np.add.reduceat(np.where(is_valid, values, 0), starts, axis=0)
+    counts = np.add.reduceat(is_valid, starts, axis=0)
+    means = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+    # Each Township-Range mean is repeated for every year, directly in the (TOWNSHIP_RANGE, YEAR) order of the index
+    value_df = pd.DataFrame(
+        np.repeat(means, len(years), axis=0),
+        index=pd.MultiIndex.from_product([township_ranges, years], names=["TOWNSHIP_RANGE", "YEAR"]),
+        columns=veg_soil_cols
+    )
 
-    # The crops values can be forward filled (the years are already sorted)
-    crops_ffill_df = df[crops_cols].copy()
-    crops_ffill_df.ffill(inplace=True)
+    # The crops values can be forward filled (the years are already sorted). The fill is done per Township-Range so
+    # that the last year of a Township-Range never leaks into the first years of the next one. The filled rows keep
+    # their order in df, so the groups do not need to be sorted
+    crops_ffill_df = df[crops_cols].groupby(level="TOWNSHIP_RANGE", sort=False, observed=True).ffill()
 
     result = pd.merge(value_df, crops_ffill_df, how="inner", left_index=True, right_index=True)
     # Just make sure that rows are sorted in the original order
@@ -173,51 +217,77 @@ def fill_pop_from_prev_year(df: pd.DataFrame):
     """
     # For population, we capture the trend over the past years 2019 to 2020 and add that to 2020 value
     # This gives us the imputed 2021 value
-    all_years = list(df.index.unique(level="YEAR"))
 
     #Find the year with missing data and sort increasingly so each year is built upon previous year value
-    miss_years = df[df['POPULATION_DENSITY'].isna()].index.unique(level='YEAR').values
-    if miss_years.shape[0] == 0:
-        return df[["POPULATION_DENSITY"]]
-
-    miss_years = sorted(miss_years, key = lambda x : int(x))
-    #print(f"These are the missing years {miss_years}")
-
+    # The missing values are located with a mask over the YEAR index level, without filtering the dataframe
+    is_missing = df["POPULATION_DENSITY"].isna().to_numpy()
     # If the dataframe does not have years with missing population density, do nothing
+    if not is_missing.any():
+        return df[["POPULATION_DENSITY"]]
 
-    all_years_trend = [f"{year}_trend" for year in all_years]
-    # Pivot the dataframe so that the TOWNSHIP_RANGE forms the index and years are along the columns
-    pop_pivot_df = df["POPULATION_DENSITY"].reset_index().pivot(
-        index=["TOWNSHIP_RANGE"], columns=["YEAR"], values=["POPULATION_DENSITY"]
+    # Lay the population out as a (TOWNSHIP_RANGE, YEAR) array and work on its columns with numpy
+    pop_wide_df = df["POPULATION_DENSITY"].unstack("YEAR")
+    all_years = pop_wide_df.columns
+    pop = pop_wide_df.to_numpy(dtype=np.float64, copy=True)
+    # The column positions of the missing years, in increasing order
+    miss_year_locs = np.sort(all_years.get_indexer(df.index.get_level_values("YEAR")[is_missing].unique()))
+    # The previous year of a missing year is the previous column, so the years must follow each other without gaps
+    if miss_year_locs[0] == 0:
+        raise ValueError(f"The population of the first year {all_years[0]} cannot be estimated from a previous year")
+    if not (np.diff(all_years.astype(int)) == 1).all():
+        raise ValueError(f"The population years are not consecutive: {list(all_years)}")
+    # The trend of a year is the difference with the previous year value
+    trend = np.full_like(pop, np.nan)
+    trend[:, 1:] = np.diff(pop, axis=1)
+
+    for year_loc in miss_year_locs:
+        # Add the trend to past year value for missing year
+        pop[:, year_loc] = pop[:, year_loc - 1] + trend[:, year_loc - 1]
+        # If the next year is also in the missing years, we need to reuse the current trend to compute the net year
+        if year_loc + 1 in miss_year_locs:
+            trend[:, year_loc] = trend[:, year_loc - 1]
+
+    # The rows are built back in the (TOWNSHIP_RANGE, YEAR) order of the index
+    return pd.DataFrame(
+        {"POPULATION_DENSITY": pop.ravel()},
+        index=pd.MultiIndex.from_product([pop_wide_df.index, all_years], names=["TOWNSHIP_RANGE", "YEAR"])
     )
 
-    # On the pivoted Dataframe, find difference between columns to get trend
-    diff_df = pop_pivot_df.diff(axis="columns").reset_index()
-    diff_df.droplevel(level=0, axis=1)
-    diff_df.columns = ["TOWNSHIP_RANGE"] + all_years_trend
-    pop_pivot_df = pop_pivot_df.droplevel(level=0, axis=1)
-    pop_pivot_df = pop_pivot_df.merge(diff_df, how="inner", on=["TOWNSHIP_RANGE"]).reset_index(drop=True)
-
-    for one_year in miss_years:
-         # Add the trend to past year value for missing year
-        prev_year = str(int(one_year) - 1)
-        pop_pivot_df[one_year] = pop_pivot_df[prev_year] + pop_pivot_df[f"{prev_year}_trend"]
-         # If the next year is also in the missing years, we need to reuse the current trend to compute the net year
-        if str(int(one_year) + 1) in miss_years:
-            pop_pivot_df[f"{one_year}_trend"] = pop_pivot_df[f"{prev_year}_trend"]
-
-    pop_pivot_df = pop_pivot_df[["TOWNSHIP_RANGE"] + list(all_years)]
-    pop_pivot_df = pd.melt(
-        pop_pivot_df,
-        id_vars=["TOWNSHIP_RANGE"],
-        var_name="YEAR",
-        value_name="POPULATION_DENSITY",
-    )
-    pop_pivot_df.set_index(["TOWNSHIP_RANGE", "YEAR"], inplace=True, drop=True)
-    # Just make sure that rows are sorted in the original order
-    pop_pivot_df.sort_index(level=["TOWNSHIP_RANGE", "YEAR"], inplace=True)
-    return pop_pivot_df
 
+def _aggregate_by_group(codes: np.ndarray, values: np.ndarray, ngroups: int, aggregation_func: str) -> np.ndarray:
+    """This function aggregates the values per group from the factorized group codes of the rows, with numpy
+    reductions over the whole arrays instead of a per group dispatch. As with pandas groupby, missing values and rows
+    without a group are ignored and groups without any value are aggregated to NaN.
+
+    :param codes: the group code of each row, -1 for rows without a group
+    :param values: the values to aggregate
+    :param ngroups: the number of groups
+    :param aggregation_func: the aggregation function, one of ['mean', 'median', 'min', 'max']
+    :return: an array of ngroups aggregated values
+    """
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    counts = np.bincount(codes, minlength=ngroups)
+    has_values = counts > 0
+    result = np.full(ngroups, np.nan)
+    if aggregation_func == "mean":
+        sums = np.bincount(codes, weights=values, minlength=ngroups)
+        result[has_values] = sums[has_values] / counts[has_values]
+        return result
+    # Sorting by group and then by value puts the values of each group in a contiguous ascending run, so the min, max
+    # and median are read at fixed positions of each run
+    values = values[np.lexsort((values, codes))]
+    starts = np.cumsum(counts) - counts
+    if aggregation_func == "min":
+        positions = [starts]
+    elif aggregation_func == "max":
+        positions = [starts + counts - 1]
+    elif aggregation_func == "median":
+        positions = [starts + (counts - 1) // 2, starts + counts // 2]
+    else:
+        raise ValueError(f"Unsupported aggregation function: {aggregation_func}")
+    result[has_values] = np.mean([values[pos[has_values]] for pos in positions], axis=0)
+    return result
 
 
 class PandasSimpleImputer(SimpleImputer):
@@ -228,7 +298,15 @@ class PandasSimpleImputer(SimpleImputer):
         return super().fit(X, y)
 
     def transform(self, X):
-        return pd.DataFrame(super().transform(X), columns=self.columns)
+        values = X.to_numpy(copy=True)
+        # A constant imputation of float data is a single masked copy of the fill value into the missing cells, which
+        # spares the validation and column by column processing of SimpleImputer
+        if self.strategy == "constant" and values.dtype.kind == "f" and self.missing_values is np.nan:
+            np.copyto(values, 0 if self.fill_value is None else self.fill_value, where=np.isnan(values))
+        else:
+            values = super().transform(X)
+        # The index of X is kept so that the imputed data can still be aligned with the original data
+        return pd.DataFrame(values, columns=self.columns, index=X.index)
 
 
 # This class uses the base classes from scikit-learn and implements fit-transform
@@ -262,10 +340,17 @@ class GroupImputer(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         # y parameter is present to maintain compatibility with other scikit-learn packages
 
-        impute_for_col = self.impute_for_col
-        impute_group_map = (
-            X.groupby(self.group_by_cols)[self.impute_for_col]
-            .agg(self.aggregation_func)
+        # The group columns can be columns or index levels of X
+        keys = [X[col] if col in X.columns else X.index.get_level_values(col) for col in self.group_by_cols]
+        if len(keys) == 1:
+            keys = pd.Index(keys[0], name=self.group_by_cols[0])
+        else:
+            keys = pd.MultiIndex.from_arrays(keys, names=self.group_by_cols)
+        groups = keys.unique().dropna().sort_values()
+        impute_group_map = pd.Series(
+            _aggregate_by_group(groups.get_indexer(keys), X[self.impute_for_col].to_numpy(dtype=np.float64),
+                                len(groups), self.aggregation_func),
+            index=groups, name=self.impute_for_col
         )
 
         ## In the case of GROUNDSURFACELEVATION_AVG, there can be township ranges where
@@ -299,18 +384,16 @@ class GroupImputer(BaseEstimator, TransformerMixin):
         # make sure that the imputer was fitted
         #check_is_fitted(self, "impute_group_map_")
 
-        # Do not modify the original source data.
-        X_new = X.reset_index().copy()
-
-        # for index, value in self.impute_group_map_.iteritems():
-        #     X.loc[index, self.impute_for_col].fillna(value, inplace=True)
-        impute_group_map = self.impute_group_map_.reset_index()
-         
-        for index, row in impute_group_map.iterrows():
-            ind = (X_new[self.group_by_cols] == row[self.group_by_cols]).all(axis=1)
-            X_new.loc[ind, self.impute_for_col] = X_new.loc[ind, self.impute_for_col].fillna(
-                row[self.impute_for_col]
-            )
+        # Do not modify the original source data. reset_index() already returns a new dataframe
+        X_new = X.reset_index()
+
+        # Align the imputation value of its group to each row with a single join, then fill all the missing values
+        # at once. Only the group and imputed columns go through the join
+        fill_values = X_new[self.group_by_cols + [self.impute_for_col]].join(
+            self.impute_group_map_, on=self.group_by_cols, rsuffix="_imp")[
+            f"{self.impute_for_col}_imp"
+        ]
+        X_new[self.impute_for_col] = X_new[self.impute_for_col].fillna(fill_values)
         X_new = X_new.set_index(['TOWNSHIP_RANGE', 'YEAR'], drop=True)
         X_new.sort_index(level=["TOWNSHIP_RANGE", "YEAR"], inplace=True)
         return X_new
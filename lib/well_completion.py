@@ -7,7 +7,7 @@ from datetime import datetime
 from typing import List
 from fiona.errors import DriverError
 from lib.wsdatasets import WsGeoDataset
-from lib.download import download_well_completion_datasets
+from lib.download import download_well_completion_datasets, ELEVATION_LATLON_DECIMALS, ELEVATION_DEM_FILE
 
 
 class WellCompletionReportsDataset(WsGeoDataset):
@@ -30,14 +30,11 @@ class WellCompletionReportsDataset(WsGeoDataset):
         super().__init__(input_geofiles=[], input_datafile="")
         self.elevation_df = self._get_missing_elevation(elevation_datadir)
         wcr_df = self._load_wcr_data(wcr_datafile=input_datafile)
+        # Set the coordinate reference system so that we now have the projection axis
         self.map_df = gpd.GeoDataFrame(
             wcr_df,
-            geometry=gpd.points_from_xy(
-                wcr_df.LONGITUDE,
-                wcr_df.LATITUDE
-            ))
-        # Set the coordinate reference system so that we now have the projection axis
-        self.map_df = self.map_df.set_crs("epsg:4326")
+            geometry=gpd.points_from_xy(wcr_df["LONGITUDE"], wcr_df["LATITUDE"]),
+            crs="epsg:4326")
         print("Loading of datasets complete.")
 
     def _download_datasets(self, input_datafile: str, elevation_datadir: str):
@@ -129,7 +126,12 @@ class WellCompletionReportsDataset(WsGeoDataset):
         :param elevation_datadir: the directory of the elevation data
         :return: the dataframe with the missing elevation data
         """
-        elevation_file_list = os.listdir(elevation_datadir)
+        # The files are read in a fixed order so that the elevation kept for a location does not depend on the
+        # filesystem. The elevations sampled from a DEM come last, they only fill the locations missing from the others
+        elevation_file_list = sorted(file_name for file_name in os.listdir(elevation_datadir)
+                                     if file_name != ELEVATION_DEM_FILE)
+        if os.path.exists(os.path.join(elevation_datadir, ELEVATION_DEM_FILE)):
+            elevation_file_list.append(ELEVATION_DEM_FILE)
         elevation_df = pd.DataFrame()
         for file_name in elevation_file_list:
             lat_long_elev_df = pd.read_csv(os.path.join(elevation_datadir, file_name),
@@ -138,6 +140,11 @@ class WellCompletionReportsDataset(WsGeoDataset):
                 elevation_df = lat_long_elev_df
             else:
                 elevation_df = pd.concat([elevation_df, lat_long_elev_df], axis=0)
+        # The elevation is joined to the wells on their rounded coordinates, keep one elevation per rounded location
+        elevation_df[["LATITUDE", "LONGITUDE"]] = elevation_df[["LATITUDE", "LONGITUDE"]].round(
+            ELEVATION_LATLON_DECIMALS)
+        elevation_df.drop_duplicates(subset=["LATITUDE", "LONGITUDE"], inplace=True)
+        elevation_df.rename(columns={"LATITUDE": "LATITUDE_ROUNDED", "LONGITUDE": "LONGITUDE_ROUNDED"}, inplace=True)
         return elevation_df
 
     def preprocess_map_df(self, features_to_keep: List[str], min_year: int = 2014):
@@ -182,10 +189,11 @@ class WellCompletionReportsDataset(WsGeoDataset):
         self.map_df["DATE"] = pd.to_datetime(self.map_df.DATEWORKENDED_CORRECTED)
         self.map_df["YEARWORKENDED"] = self.map_df["DATE"].dt.year
         self.map_df["MONTHWORKENDED"] = self.map_df["DATE"].dt.month
-        # Merge missing elevation data
-        self.map_df = self.map_df.merge(self.elevation_df, how="left", left_on=["LATITUDE", "LONGITUDE"],
-                                        right_on=["LATITUDE", "LONGITUDE"])
-        self.map_df.drop(columns=["GROUNDSURFACEELEVATION"], inplace=True)
+        # Merge missing elevation data on the rounded coordinates used when querying the elevation service
+        self.map_df["LATITUDE_ROUNDED"] = self.map_df["LATITUDE"].round(ELEVATION_LATLON_DECIMALS)
+        self.map_df["LONGITUDE_ROUNDED"] = self.map_df["LONGITUDE"].round(ELEVATION_LATLON_DECIMALS)
+        self.map_df = self.map_df.merge(self.elevation_df, how="left", on=["LATITUDE_ROUNDED", "LONGITUDE_ROUNDED"])
+        self.map_df.drop(columns=["GROUNDSURFACEELEVATION", "LATITUDE_ROUNDED", "LONGITUDE_ROUNDED"], inplace=True)
         self.map_df.rename(columns={"elev_meters": "GROUNDSURFACEELEVATION", "YEARWORKENDED": "YEAR",
                                     "MONTHWORKENDED": "MONTH"}, inplace=True)
         # Keep only the data after min_year and before the current year
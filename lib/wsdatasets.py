@@ -1,6 +1,7 @@
 # This file contains the base Class definition for the Waters Shortage Datasets
 import os
 import pandas as pd
+import pyarrow as pa
 import pygeos
 import geopandas as gpd
 
@@ -10,6 +11,25 @@ from shapely.geometry import Polygon, MultiPolygon, MultiPoint
 from shapely.ops import voronoi_diagram
 from lib.download import download_sjv_shapefile, download_ca_shapefile
 
+# The geospatial files are read with pyogrio when it is installed, which reads whole columns through the GDAL C API
+# instead of reading the features one by one through fiona
+try:
+    from pyogrio import read_dataframe
+except ImportError:
+    read_dataframe = None
+
+
+def read_geospatial_file(filename: str) -> gpd.GeoDataFrame:
+    """This function reads a geospatial file, e.g. a Shapefile or a GeoJSON file, in a GeoDataFrame.
+
+    :param filename: the geospatial file
+    :return: the GeoPandas Dataframe
+    """
+    # A missing file is left to GeoPandas, so that it raises the same errors, whether pyogrio is installed or not
+    if read_dataframe is not None and os.path.exists(filename):
+        return read_dataframe(filename)
+    return gpd.read_file(filename)
+
 
 class WsGeoDataset():
     """
@@ -44,8 +64,10 @@ class WsGeoDataset():
         if input_geofiles:
             self.map_df = self._read_geospatial_file(input_geofiles[0])
             if len(input_geofiles) > 1:
-                for input_shapefile in input_geofiles[1:]:
-                    self.map_df = pd.concat([self.map_df, self._read_geospatial_file(input_shapefile)], axis=0)
+                # All the files are read first and concatenated at once, instead of copying the growing map_df for
+                # each file
+                self.map_df = pd.concat([self.map_df] + [self._read_geospatial_file(input_shapefile)
+                                                         for input_shapefile in input_geofiles[1:]], axis=0)
                 self.map_df.reset_index(inplace=True, drop=True)
         # Load the separate feature dataset file if provided
         if input_datafile:
@@ -63,10 +85,11 @@ class WsGeoDataset():
         :param filename: the geospatial fle
         :return: the GeoPandas Dataframe with projection set to EPSG:4326
         """
-        return gpd.read_file(filename).to_crs(epsg=4326)
+        return read_geospatial_file(filename).to_crs(epsg=4326)
 
     def _read_input_datafile(self, input_datafile: str, input_datafile_format: str = "csv") -> pd.DataFrame:
-        """This functions loads additional data not provided together with the map data.
+        """This functions loads additional data not provided together with the map data. The first time a CSV file is
+        read, it is converted into a Parquet file next to it, which is used to load the data faster the next times.
 
         :param input_datafile: the path to the file containing the additional data dataset
         :param input_datafile_format: the format of the input_datafile (e.g. "csv", "xlsx", etc.)
@@ -74,7 +97,19 @@ class WsGeoDataset():
         """
         data_df = None
         if input_datafile_format == "csv":
+            # The Parquet file stores the already typed columns, so it is loaded without parsing the CSV file again. It
+            # is only used as long as it is not older than the CSV file
+            parquet_file = os.path.splitext(input_datafile)[0] + ".parquet"
+            if os.path.exists(parquet_file) and (not os.path.exists(input_datafile) or
+                                                 os.path.getmtime(parquet_file) >= os.path.getmtime(input_datafile)):
+                return pd.read_parquet(parquet_file)
             data_df = pd.read_csv(input_datafile)
+            try:
+                data_df.to_parquet(parquet_file, compression="zstd", index=False)
+            except (pa.ArrowException, ValueError):
+                # Columns mixing several types cannot be stored in Parquet, the CSV file is then read every time
+                if os.path.exists(parquet_file):
+                    os.remove(parquet_file)
         elif input_datafile_format in {"xls", "xlsx"}:
             data_df = pd.read_excel(input_datafile)
         return data_df
@@ -123,10 +158,10 @@ class WsGeoDataset():
         San Joaquin Valley
         """
         try:
-            sjv_plss_df = gpd.read_file(sjv_shapefile)
+            sjv_plss_df = read_geospatial_file(sjv_shapefile)
         except (FileNotFoundError, DriverError):
             download_sjv_shapefile(sjv_shapefile)
-            sjv_plss_df = gpd.read_file(sjv_shapefile)
+            sjv_plss_df = read_geospatial_file(sjv_shapefile)
         # We use GeoPandas dissolve function to dissolve all the geometries in Township-Ranges as one to get only one
         # geometry (i.e. one row in the GeoPandas DataFrame) per Township-Range
         sjv_township_range_df = sjv_plss_df.dissolve(by='TownshipRange').reset_index()
@@ -158,17 +193,24 @@ class WsGeoDataset():
         # Try to read the California Counties geospatial data on the local filesystem. If the file is not there,
         # download it first
         try:
-            ca_geodf = gpd.read_file(ca_shapefile).to_crs(epsg=4326)
+            ca_geodf = read_geospatial_file(ca_shapefile).to_crs(epsg=4326)
         except (FileNotFoundError, DriverError):
             download_ca_shapefile(ca_shapefile)
-            ca_geodf = gpd.read_file(ca_shapefile).to_crs(epsg=4326)
+            ca_geodf = read_geospatial_file(ca_shapefile).to_crs(epsg=4326)
         ca_counties = ca_geodf[["NAME", "geometry"]].copy()
         ca_counties.rename(columns={"NAME": "COUNTY"}, inplace=True)
+        # Dissolving all the counties is slow and done by every dataset. The California boundaries are stored in a
+        # GeoParquet file next to the counties shapefile so that they are only dissolved again when the shapefile
+        # changes
+        boundaries_file = os.path.splitext(ca_shapefile)[0] + "_boundaries.parquet"
+        if os.path.exists(boundaries_file) and os.path.getmtime(boundaries_file) >= os.path.getmtime(ca_shapefile):
+            return ca_counties, gpd.read_parquet(boundaries_file)
         # Create an artificial column with a unique value to merge all the Polygons together
         ca_geodf["merge"] = 0
         # We use GeoPandas dissolve function to dissolve all the counties geometries as one to get the California
         # state boundaries
         ca_boundaries = ca_geodf.dissolve(by="merge")
+        ca_boundaries.to_parquet(boundaries_file)
         return ca_counties, ca_boundaries
 
     def preprocess_map_df(self, features_to_keep: List[str]):
@@ -207,23 +249,18 @@ class WsGeoDataset():
         "CROP_TYPE").
         :param feature_value: the value to fill the feature with (e.g. "X", "Unclassified", or 0).
         """
-        # Get the list of the Township-Ranges in the San Joaquin Valley
-        all_townships = set(self.sjv_township_range_df["TOWNSHIP_RANGE"].unique())
-        # For all the years in the dataset
-        for year in self.map_df["YEAR"].unique():
-            year_df = self.map_df[self.map_df["YEAR"] == year]
-            # Get the list of the Township-Ranges with no data for that year
-            missing_townships = all_townships - set(year_df["TOWNSHIP_RANGE"].unique())
-            # Get the geospatial data of the missing Township-Ranges
-            missing_townships_df = self.sjv_township_range_df[self.sjv_township_range_df["TOWNSHIP_RANGE"].isin(
-                missing_townships)].copy()
-            # Add the year column to the missing Township-Ranges
-            missing_townships_df["YEAR"] = year
-            # Add feature values to the missing Township-Ranges
-            for feature in features_to_fill:
-                missing_townships_df[feature] = feature_value
-            # Add the new rows to the final dataset
-            self.map_df = pd.concat([self.map_df, missing_townships_df], axis=0)
+        # Broadcast the Township-Ranges in the San Joaquin Valley to all the years in the dataset and keep only the
+        # (Township-Range, year) pairs with no data
+        all_pairs = pd.MultiIndex.from_product([self.sjv_township_range_df["TOWNSHIP_RANGE"].unique(),
+                                                self.map_df["YEAR"].unique()], names=["TOWNSHIP_RANGE", "YEAR"])
+        missing_pairs = all_pairs.difference(pd.MultiIndex.from_frame(self.map_df[["TOWNSHIP_RANGE", "YEAR"]]))
+        # Get the geospatial data of the missing Township-Ranges for each of their missing years
+        missing_townships_df = self.sjv_township_range_df.merge(missing_pairs.to_frame(index=False),
+                                                                on="TOWNSHIP_RANGE").sort_values("YEAR", kind="stable")
+        # Add feature values to the missing Township-Ranges
+        missing_townships_df = missing_townships_df.assign(**{feature: feature_value for feature in features_to_fill})
+        # Add the new rows to the final dataset
+        self.map_df = pd.concat([self.map_df, missing_townships_df], axis=0)
 
     ####################################################################################################################
     # Feature processing functions
@@ -248,22 +285,21 @@ class WsGeoDataset():
         TopologyException errors when overlaying the Township boundaries on some datasets.
         """
         self.keep_only_sjv_data()
-        new_map_df = gpd.GeoDataFrame()
-        for i, year in enumerate(self.map_df["YEAR"].unique()):
+        if set_precision:
+            # We set the precision to avoid a "TopologyException: found non-noded intersection error from overlay"
+            # reference:https://github.com/geopandas/geopandas/issues/1724
+            self.sjv_township_range_df.geometry = pygeos.set_precision(self.sjv_township_range_df.geometry.values.data,
+                                                                       1e-6)
+        # The yearly overlays are collected and concatenated at once, instead of copying the growing result every year
+        yearly_overlays = []
+        for year in self.map_df["YEAR"].unique():
             yearly_map_df = self.map_df[self.map_df["YEAR"] == year].copy()
             # Overlay the townships boundaries on the map data units to cut and explode them based on the townships
             if set_precision:
-                # We set the precision to avoid a "TopologyException: found non-noded intersection error from overlay"
-                # reference:https://github.com/geopandas/geopandas/issues/1724
                 yearly_map_df.geometry = pygeos.set_precision(yearly_map_df.geometry.values.data, 1e-6)
-                self.sjv_township_range_df.geometry = pygeos.set_precision(self.sjv_township_range_df.geometry.values.data,
-                                                                       1e-6)
-            map_data_by_township_df = gpd.overlay(yearly_map_df, self.sjv_township_range_df, how='identity',
-                                                  keep_geom_type=True)
-            if i == 0:
-                new_map_df = map_data_by_township_df.copy()
-            else:
-                new_map_df = pd.concat([new_map_df, map_data_by_township_df], axis=0)
+            yearly_overlays.append(gpd.overlay(yearly_map_df, self.sjv_township_range_df, how='identity',
+                                               keep_geom_type=True))
+        new_map_df = pd.concat(yearly_overlays, axis=0) if yearly_overlays else gpd.GeoDataFrame()
         new_map_df.reset_index(inplace=True, drop=True)
         # There's a bug in the GeoPandas overlay function which can convert years in floats
         new_map_df["YEAR"] = new_map_df["YEAR"].astype(int)
@@ -276,7 +312,9 @@ class WsGeoDataset():
         year to year.
 
         :param boundary: the envelope or boundary to use to compute the Voronoi Diagram."""
-        new_map_df = gpd.GeoDataFrame()
+        # The yearly Voronoi regions are collected and concatenated at once, instead of copying the growing result
+        # every year
+        yearly_regions = []
         if boundary == "svj":
             envelope = self.sjv_boundaries.geometry[0]
         else:
@@ -295,8 +333,8 @@ class WsGeoDataset():
             voronoi_regions_df = voronoi_regions_df.sjoin(year_df)
             # Clip the shapes within the boundaries
             voronoi_regions_df = gpd.clip(voronoi_regions_df, envelope)
-            new_map_df = pd.concat([new_map_df, voronoi_regions_df], axis=0)
-        self.map_df = new_map_df
+            yearly_regions.append(voronoi_regions_df)
+        self.map_df = pd.concat(yearly_regions, axis=0) if yearly_regions else gpd.GeoDataFrame()
         if "index_right" in list(self.map_df.columns):
             self.map_df.drop(columns=["index_right"], inplace=True)
 
@@ -400,7 +438,7 @@ class WsGeoDataset():
         self.map_df = self.map_df.to_crs(epsg=3347)
         self.map_df["AREA"] = self.map_df.geometry.area
         self.map_df["AREA_PCT"] = self.map_df[["TOWNSHIP_RANGE", "YEAR", "AREA"]].\
-            groupby(["TOWNSHIP_RANGE", "YEAR"])["AREA"].apply(lambda x: x / x.sum())
+            groupby(["TOWNSHIP_RANGE", "YEAR"], sort=False)["AREA"].apply(lambda x: x / x.sum())
         self.map_df = self.map_df.to_crs(epsg=4326)
         self.map_df.drop(columns=["AREA"], inplace=True)
 
@@ -418,7 +456,7 @@ class WsGeoDataset():
             norm_function = lambda x: (x - x.mean()) / x.std()
         else:
             norm_function = lambda x: x / x.mean()
-        normalized_df[f"{feature_name}_NORMALIZED"] = normalized_df.groupby("YEAR")[feature_name].transform(
+        normalized_df[f"{feature_name}_NORMALIZED"] = normalized_df.groupby("YEAR", sort=False)[feature_name].transform(
             norm_function)
         return normalized_df
 